@@ -0,0 +1,106 @@
+"""
+Serialization benchmark for /services responses and store persistence.
+
+Compares the default FastAPI path (response_model validation + stdlib json)
+and the indented persistence format with the cached/compact encoders.
+
+Usage:
+    python scripts/bench_serialization.py --services 2000 --rounds 20
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from src.models import ServiceEvent, ServiceRecord, ServiceStatus  # noqa: E402
+from src.serialization import (  # noqa: E402
+    encode_events,
+    encode_object,
+    orjson,
+    record_encoder,
+)
+
+
+def build_records(count: int) -> list[ServiceRecord]:
+    return [
+        ServiceRecord(
+            id=f"{index:032x}",
+            idea=f"A service that does thing number {index}",
+            requester_id="bench",
+            metadata={"index": index},
+            status=ServiceStatus.DEPLOYED,
+            api_base_url=f"https://{index:032x}.vercel.app",
+        )
+        for index in range(count)
+    ]
+
+
+def timed(rounds: int, func) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    records = build_records(args.services)
+    events = {
+        record.id: [
+            ServiceEvent(service_id=record.id, status=ServiceStatus.QUEUED)
+            for _ in range(args.events)
+        ]
+        for record in records
+    }
+    adapter = TypeAdapter(list[ServiceRecord])
+
+    def response_default() -> bytes:
+        validated = adapter.validate_python(records, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+    def response_cached() -> bytes:
+        return record_encoder.encode_many(records)
+
+    def persist_default() -> bytes:
+        payload = {
+            "services": {r.id: r.model_dump(mode="json") for r in records},
+            "events": {
+                key: [event.model_dump(mode="json") for event in value]
+                for key, value in events.items()
+            },
+            "api_keys": {},
+        }
+        return json.dumps(payload, indent=2, sort_keys=True).encode("utf-8")
+
+    def persist_compact() -> bytes:
+        return encode_object(
+            {
+                "services": encode_object({r.id: record_encoder.encode(r) for r in records}),
+                "events": encode_object({k: encode_events(v) for k, v in events.items()}),
+                "api_keys": b"{}",
+            }
+        )
+
+    response_cached()  # warm the record cache, as a long-running server would be
+    print(f"services={args.services} events/service={args.events} orjson={orjson is not None}")
+    print(f"/services default:   {timed(args.rounds, response_default):8.2f} ms")
+    print(f"/services cached:    {timed(args.rounds, response_cached):8.2f} ms")
+    print(f"persist indented:    {timed(args.rounds, persist_default):8.2f} ms "
+          f"({len(persist_default()) // 1024} KiB)")
+    print(f"persist compact:     {timed(args.rounds, persist_compact):8.2f} ms "
+          f"({len(persist_compact()) // 1024} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Startup and flush benchmark for ServiceStore.
+
+Generates a synthetic store file and times eager vs lazy (snapshot) loading,
+including lazy startup when the event rollups have to be rebuilt, and a flush
+after a single update.
+
+Usage:
+    python scripts/bench_store.py --services 20000 --events 5
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def build_fixture(path: Path, services: int, events: int) -> None:
+    """Write a store file shaped like the output of ServiceStore."""
+    now = "2026-02-03T00:00:00+00:00"
+    payload = {"services": {}, "events": {}, "api_keys": {}}
+    for index in range(services):
+        service_id = f"{index:032x}"
+        payload["services"][service_id] = {
+            "id": service_id,
+            "idea": f"A service that does thing number {index}",
+            "requester_id": "bench",
+            "metadata": {"index": index},
+            "status": "deployed",
+            "token_address": None,
+            "api_base_url": f"https://{service_id}.vercel.app",
+            "created_at": now,
+            "updated_at": now,
+        }
+        payload["events"][service_id] = [
+            {"service_id": service_id, "status": "queued", "message": None, "created_at": now}
+            for _ in range(events)
+        ]
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def time_startup(lazy: bool) -> tuple[float, float]:
+    """Return seconds until the store is constructed and until its rollups are ready."""
+    from src.store import ServiceStore
+
+    os.environ["SERVICE_STORE_LAZY"] = "1" if lazy else "0"
+    # Don't charge the previous run's garbage to this one.
+    gc.collect()
+    started = time.perf_counter()
+    store = ServiceStore()
+    elapsed = time.perf_counter() - started
+    assert store.startup_seconds <= elapsed
+    store.wait_for_rollups()
+    return elapsed, time.perf_counter() - started
+
+
+def time_flush(lazy: bool) -> float:
+    """Return seconds for the second flush after one update, once encodings are cached."""
+    from src.models import ServiceStatus
+    from src.store import ServiceStore
+
+    os.environ["SERVICE_STORE_LAZY"] = "1" if lazy else "0"
+    os.environ["SERVICE_STORE_FLUSH_INTERVAL"] = "0"
+    try:
+        store = ServiceStore()
+        service_id = store.list_services()[0].id
+        store.update_status(service_id, ServiceStatus.DEPLOYED)
+        gc.collect()
+        started = time.perf_counter()
+        store.update_status(service_id, ServiceStatus.DEPLOYED)
+        return time.perf_counter() - started
+    finally:
+        del os.environ["SERVICE_STORE_FLUSH_INTERVAL"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = Path(tmp) / "store.json"
+        build_fixture(store_path, args.services, args.events)
+        os.environ["SERVICE_STORE_PATH"] = str(store_path)
+        os.environ.pop("SERVICE_EVENTS_PATH", None)
+
+        rollups_path = store_path.with_name(store_path.name + ".rollups")
+
+        eager, _ = time_startup(lazy=False)
+        rollups_path.unlink(missing_ok=True)
+        first_lazy, _ = time_startup(lazy=True)
+        warm_lazy, _ = time_startup(lazy=True)
+        rollups_path.unlink(missing_ok=True)
+        rebuild_lazy, rebuild_ready = time_startup(lazy=True)
+        eager_flush = time_flush(lazy=False)
+        lazy_flush = time_flush(lazy=True)
+
+    print(f"services={args.services} events/service={args.events}")
+    print(f"eager startup:              {eager * 1000:9.1f} ms")
+    print(f"lazy startup (build index): {first_lazy * 1000:9.1f} ms")
+    print(f"lazy startup (mapped):      {warm_lazy * 1000:9.1f} ms")
+    print(
+        f"lazy startup (no rollups):  {rebuild_lazy * 1000:9.1f} ms"
+        f" (rollups ready after {rebuild_ready * 1000:.1f} ms)"
+    )
+    print(f"eager flush (one update):   {eager_flush * 1000:9.1f} ms")
+    print(f"lazy flush (one update):    {lazy_flush * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Admission control and load shedding for the backend.
+
+Route handlers are sync functions, so each admitted request occupies a
+worker thread. The admission middleware runs on the event loop before a
+thread is taken: every request is classified (critical, read, write, heavy),
+and each class has a concurrency limit, a bounded wait queue with a
+deadline, and a headroom of threads it must leave free for higher-priority
+classes. Requests that cannot be admitted in time get a fast 503 with
+``Retry-After``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+# Highest priority first. Freed capacity is offered to waiters in this order.
+PRIORITIES = ("critical", "read", "write", "heavy")
+
+
+@dataclass
+class AdmissionClass:
+    """Limits and counters for one class of requests."""
+
+    name: str
+    max_concurrent: int
+    max_queue: int
+    queue_timeout: float
+    # Threads this class must leave free for higher-priority classes.
+    headroom: int = 0
+    retry_after: int = 1
+    active: int = 0
+    admitted: int = 0
+    rejected_queue_full: int = 0
+    rejected_timeout: int = 0
+    waiters: deque[asyncio.Future[None]] = field(default_factory=deque)
+
+
+def _env_number(name: str, default: float, kind: type[int] | type[float] = int) -> Any:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+def default_classes(capacity: int) -> dict[str, AdmissionClass]:
+    """
+    Build the default classes, overridable via ADMISSION_<CLASS>_* env vars.
+
+    Headrooms scale with capacity so lower-priority classes always leave at
+    least as many threads free as higher-priority ones, and never all of them.
+
+    Raises:
+        ValueError: If the capacity or an override is invalid
+    """
+    if capacity < 1:
+        raise ValueError(f"Admission capacity must be at least 1, got {capacity}")
+    max_headroom = capacity - 1
+    defaults = {
+        "critical": (capacity, 0, 0.0, 0, 1),
+        "read": (capacity, 64, 2.0, min(capacity // 16, max_headroom), 1),
+        "write": (max(capacity // 2, 1), 32, 5.0, min(capacity // 8, max_headroom), 2),
+        "heavy": (max(capacity // 8, 1), 16, 10.0, min(capacity // 4, max_headroom), 5),
+    }
+    classes = {}
+    for name, (limit, queue, timeout, headroom, retry_after) in defaults.items():
+        prefix = f"ADMISSION_{name.upper()}"
+        classes[name] = AdmissionClass(
+            name=name,
+            max_concurrent=_env_number(f"{prefix}_LIMIT", limit),
+            max_queue=_env_number(f"{prefix}_QUEUE", queue),
+            queue_timeout=_env_number(f"{prefix}_TIMEOUT", timeout, float),
+            headroom=_env_number(f"{prefix}_HEADROOM", headroom),
+            retry_after=_env_number(f"{prefix}_RETRY_AFTER", retry_after),
+        )
+    validate_classes(classes, capacity)
+    return classes
+
+
+def validate_classes(classes: dict[str, AdmissionClass], capacity: int) -> None:
+    """
+    Check that every class can be admitted on an idle server and that
+    headrooms never let a lower-priority class in ahead of a higher one.
+
+    Raises:
+        ValueError: On the first invalid setting
+    """
+    previous: AdmissionClass | None = None
+    for name in PRIORITIES:
+        admission_class = classes.get(name)
+        if admission_class is None:
+            continue
+        prefix = f"ADMISSION_{name.upper()}"
+        if admission_class.max_concurrent < 1:
+            raise ValueError(f"{prefix}_LIMIT must be at least 1")
+        if admission_class.max_queue < 0:
+            raise ValueError(f"{prefix}_QUEUE must not be negative")
+        if admission_class.queue_timeout < 0:
+            raise ValueError(f"{prefix}_TIMEOUT must not be negative")
+        if admission_class.retry_after < 0:
+            raise ValueError(f"{prefix}_RETRY_AFTER must not be negative")
+        if not 0 <= admission_class.headroom < capacity:
+            raise ValueError(
+                f"{prefix}_HEADROOM must be between 0 and {capacity - 1} "
+                f"(THREADPOOL_SIZE - 1), got {admission_class.headroom}"
+            )
+        if previous is not None and admission_class.headroom < previous.headroom:
+            raise ValueError(
+                f"{prefix}_HEADROOM ({admission_class.headroom}) must not be smaller than "
+                f"ADMISSION_{previous.name.upper()}_HEADROOM ({previous.headroom})"
+            )
+        previous = admission_class
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, admission_class: AdmissionClass, reason: str) -> None:
+        super().__init__(reason)
+        self.admission_class = admission_class
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Priority-aware admission across a shared pool of worker threads.
+
+    All state is owned by the event loop, so no locks are needed.
+    """
+
+    def __init__(self, capacity: int, classes: dict[str, AdmissionClass]) -> None:
+        self.capacity = capacity
+        self.classes = classes
+        self._ordered = [classes[name] for name in PRIORITIES if name in classes]
+
+    @property
+    def total_active(self) -> int:
+        return sum(admission_class.active for admission_class in self._ordered)
+
+    def _has_room(self, admission_class: AdmissionClass) -> bool:
+        if admission_class.active >= admission_class.max_concurrent:
+            return False
+        if admission_class.name == "critical":
+            return True
+        return self.total_active < self.capacity - admission_class.headroom
+
+    async def acquire(self, name: str) -> AdmissionClass:
+        admission_class = self.classes[name]
+        if not admission_class.waiters and self._has_room(admission_class):
+            admission_class.active += 1
+            admission_class.admitted += 1
+            return admission_class
+        if len(admission_class.waiters) >= admission_class.max_queue:
+            admission_class.rejected_queue_full += 1
+            raise AdmissionRejected(admission_class, "queue_full")
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        admission_class.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), admission_class.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                admission_class.waiters.remove(waiter)
+                waiter.cancel()
+                admission_class.rejected_timeout += 1
+                raise AdmissionRejected(admission_class, "timeout") from None
+        except asyncio.CancelledError:
+            # Client went away; hand the slot on if it was already granted.
+            if waiter.done() and not waiter.cancelled():
+                self.release(admission_class)
+            elif waiter in admission_class.waiters:
+                admission_class.waiters.remove(waiter)
+            raise
+        admission_class.admitted += 1
+        return admission_class
+
+    def release(self, admission_class: AdmissionClass) -> None:
+        admission_class.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for admission_class in self._ordered:
+            while admission_class.waiters and self._has_room(admission_class):
+                waiter = admission_class.waiters.popleft()
+                if waiter.done():
+                    continue
+                admission_class.active += 1
+                waiter.set_result(None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "active": self.total_active,
+            "classes": {
+                admission_class.name: {
+                    "active": admission_class.active,
+                    "queued": len(admission_class.waiters),
+                    "max_concurrent": admission_class.max_concurrent,
+                    "max_queue": admission_class.max_queue,
+                    "admitted": admission_class.admitted,
+                    "rejected_queue_full": admission_class.rejected_queue_full,
+                    "rejected_timeout": admission_class.rejected_timeout,
+                }
+                for admission_class in self._ordered
+            },
+        }
+
+
+def classify_request(method: str, path: str) -> str:
+    if path in ("/", "/health") or path.startswith("/admin/"):
+        return "critical"
+    if method == "POST" and path.endswith(("/deploy", "/generate")):
+        return "heavy"
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "read"
+    return "write"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits or sheds requests before they reach a handler."""
+
+    def __init__(
+        self,
+        app: Any,
+        controller: AdmissionController,
+        classify: Callable[[str, str], str] = classify_request,
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = self.classify(scope["method"], scope["path"])
+        try:
+            admission_class = await self.controller.acquire(name)
+        except AdmissionRejected as rejected:
+            await self._reject(send, rejected)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(admission_class)
+
+    @staticmethod
+    async def _reject(send: Any, rejected: AdmissionRejected) -> None:
+        body = json.dumps(
+            {"detail": "Server busy, retry later", "reason": rejected.reason}
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                    (b"retry-after", str(rejected.admission_class.retry_after).encode("ascii")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
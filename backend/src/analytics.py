@@ -1,10 +1,23 @@
 from __future__ import annotations
 
 import json
+import math
 import os
+import threading
+from collections.abc import Iterable
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
-from .models import ServiceEvent
+from .models import ServiceEvent, ServiceStatus
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+# Buckets kept per resolution; None keeps everything.
+RETENTION = {"minute": 2 * 1440, "hour": 90 * 24, "day": None}
+LATENCY_GROWTH = 1.05
+STATUSES = list(ServiceStatus)
+_STATUS_INDEX = {status: index for index, status in enumerate(STATUSES)}
+_VALUE_INDEX = {status.value: index for index, status in enumerate(STATUSES)}
 
 
 def load_events_from_path() -> dict[str, list[ServiceEvent]]:
@@ -19,3 +32,215 @@ def load_events_from_path() -> dict[str, list[ServiceEvent]]:
         service_id: [ServiceEvent(**event) for event in events]
         for service_id, events in payload.items()
     }
+
+
+def _bucket_start(moment: float, width: int) -> int:
+    return int(moment) // width * width
+
+
+def _parse_timestamp(value: str) -> float:
+    # fromisoformat only accepts a trailing "Z" from Python 3.11 on.
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value).timestamp()
+
+
+class EventRollups:
+    """
+    Incremental time-series rollups of service events.
+
+    Events are counted into minute/hour/day buckets per status as they are
+    appended, and deploy latencies (deploying -> deployed) are kept in a
+    log-scale histogram, so analytics never scan raw event lists. Each bucket
+    is a list of counts indexed by ``STATUSES``.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: dict[str, dict[int, list[int]]] = {name: {} for name in RESOLUTIONS}
+        self._latency: dict[int, int] = {}
+        self._latency_count = 0
+        self._latency_max = 0.0
+        self._deploy_started: dict[str, float] = {}
+
+    @classmethod
+    def from_events(cls, events: Iterable[ServiceEvent]) -> EventRollups:
+        rollups = cls()
+        for event in sorted(events, key=lambda event: event.created_at):
+            rollups.record(event)
+        return rollups
+
+    @classmethod
+    def from_payloads(cls, events: Iterable[dict[str, Any]]) -> EventRollups:
+        """Build rollups from stored event JSON without constructing models."""
+        parsed = sorted(
+            (_parse_timestamp(event["created_at"]), _VALUE_INDEX[event["status"]], event["service_id"])
+            for event in events
+            if event.get("status") in _VALUE_INDEX
+        )
+        rollups = cls()
+        for moment, status_index, service_id in parsed:
+            rollups._record(service_id, status_index, moment)
+        return rollups
+
+    def record(self, event: ServiceEvent) -> None:
+        with self._lock:
+            self._record(
+                event.service_id, _STATUS_INDEX[event.status], event.created_at.timestamp()
+            )
+
+    def _record(self, service_id: str, status_index: int, moment: float) -> None:
+        for name, width in RESOLUTIONS.items():
+            series = self._series[name]
+            start = _bucket_start(moment, width)
+            bucket = series.get(start)
+            if bucket is None:
+                bucket = series[start] = [0] * len(STATUSES)
+                self._prune(name, start)
+            bucket[status_index] += 1
+        self._record_latency(service_id, STATUSES[status_index], moment)
+
+    def merge(self, older: EventRollups) -> None:
+        """
+        Fold in rollups of events that happened before everything recorded here.
+
+        Deploys that straddle the two (deploying in ``older``, deployed here)
+        are not counted in the latency histogram.
+        """
+        with older._lock:
+            series = {name: dict(buckets) for name, buckets in older._series.items()}
+            latency = dict(older._latency)
+            latency_max = older._latency_max
+            deploy_started = dict(older._deploy_started)
+        with self._lock:
+            for name, buckets in series.items():
+                target = self._series[name]
+                for start, counts in buckets.items():
+                    bucket = target.get(start)
+                    if bucket is None:
+                        target[start] = list(counts)
+                    else:
+                        target[start] = [a + b for a, b in zip(bucket, counts)]
+                if target:
+                    self._prune(name, max(target))
+            for index, count in latency.items():
+                self._latency[index] = self._latency.get(index, 0) + count
+                self._latency_count += count
+            self._latency_max = max(self._latency_max, latency_max)
+            for service_id, started in deploy_started.items():
+                self._deploy_started.setdefault(service_id, started)
+
+    def _prune(self, name: str, newest: int) -> None:
+        retention = RETENTION[name]
+        series = self._series[name]
+        # Prune in batches so inserts stay amortized O(1).
+        if retention is None or len(series) <= retention + retention // 10:
+            return
+        cutoff = newest - retention * RESOLUTIONS[name]
+        for start in [start for start in series if start <= cutoff]:
+            del series[start]
+
+    def _record_latency(self, service_id: str, status: ServiceStatus, moment: float) -> None:
+        if status == ServiceStatus.DEPLOYING:
+            self._deploy_started[service_id] = moment
+        elif status in (ServiceStatus.DEPLOYED, ServiceStatus.FAILED):
+            started = self._deploy_started.pop(service_id, None)
+            if started is None or status == ServiceStatus.FAILED:
+                return
+            seconds = max(moment - started, 0.0)
+            index = int(math.log(seconds * 1000, LATENCY_GROWTH)) if seconds >= 0.001 else -1
+            self._latency[index] = self._latency.get(index, 0) + 1
+            self._latency_count += 1
+            self._latency_max = max(self._latency_max, seconds)
+
+    def timeseries(
+        self, resolution: str, limit: int, until: datetime | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Return the last ``limit`` buckets ending at ``until``, zero-filled.
+
+        A naive ``until`` is taken as UTC, not server local time.
+        """
+        width = RESOLUTIONS[resolution]
+        if until is None:
+            until = datetime.now(timezone.utc)
+        elif until.tzinfo is None:
+            until = until.replace(tzinfo=timezone.utc)
+        end = _bucket_start(until.timestamp(), width)
+        points = []
+        with self._lock:
+            series = self._series[resolution]
+            for start in range(end - (limit - 1) * width, end + width, width):
+                counts = series.get(start)
+                points.append(
+                    {
+                        "start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                        "total": sum(counts) if counts else 0,
+                        "counts": {
+                            status.value: counts[index] if counts else 0
+                            for index, status in enumerate(STATUSES)
+                        },
+                    }
+                )
+        return points
+
+    def latency_percentiles(
+        self, percentiles: Iterable[float] = (50, 90, 99)
+    ) -> dict[str, float | int | None]:
+        """Approximate deploy latency percentiles in seconds (within ~5%)."""
+        with self._lock:
+            buckets = sorted(self._latency.items())
+            total = self._latency_count
+            latency_max = self._latency_max
+        result: dict[str, float | int | None] = {
+            "count": total,
+            "max": round(latency_max, 3) if total else None,
+        }
+        for percentile in percentiles:
+            key = f"p{percentile:g}"
+            if not total:
+                result[key] = None
+                continue
+            rank = max(math.ceil(total * percentile / 100), 1)
+            seen = 0
+            for index, count in buckets:
+                seen += count
+                if seen >= rank:
+                    estimate = 0.0 if index < 0 else LATENCY_GROWTH ** (index + 0.5) / 1000
+                    result[key] = round(min(estimate, latency_max), 3)
+                    break
+        return result
+
+    def to_json(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "version": 1,
+                "statuses": [status.value for status in STATUSES],
+                "series": {
+                    name: {str(start): list(counts) for start, counts in series.items()}
+                    for name, series in self._series.items()
+                },
+                "latency": {str(index): count for index, count in self._latency.items()},
+                "latency_max": self._latency_max,
+                "deploy_started": dict(self._deploy_started),
+            }
+
+    @classmethod
+    def from_json(cls, payload: dict[str, Any]) -> EventRollups:
+        rollups = cls()
+        # Map persisted columns by name so adding a status keeps old rollups valid.
+        columns = [_VALUE_INDEX.get(value) for value in payload["statuses"]]
+        for name, series in payload.get("series", {}).items():
+            if name not in RESOLUTIONS:
+                continue
+            for start, counts in series.items():
+                bucket = [0] * len(STATUSES)
+                for column, count in zip(columns, counts):
+                    if column is not None:
+                        bucket[column] = count
+                rollups._series[name][int(start)] = bucket
+        rollups._latency = {int(index): count for index, count in payload.get("latency", {}).items()}
+        rollups._latency_count = sum(rollups._latency.values())
+        rollups._latency_max = payload.get("latency_max", 0.0)
+        rollups._deploy_started = dict(payload.get("deploy_started", {}))
+        return rollups
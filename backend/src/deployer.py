@@ -8,6 +8,8 @@ from dataclasses import dataclass
 from typing import Optional
 from pathlib import Path
 
+from .profiling import profiled
+
 
 @dataclass
 class DeploymentResult:
@@ -25,6 +27,7 @@ class ServiceDeployer:
     def __init__(self, vercel_token: Optional[str] = None):
         self.vercel_token = vercel_token or os.getenv("VERCEL_TOKEN")
         
+    @profiled("deployer.deploy_to_vercel")
     def deploy_to_vercel(
         self,
         service_id: str,
@@ -95,6 +98,7 @@ class ServiceDeployer:
             if deploy_dir.exists():
                 shutil.rmtree(deploy_dir)
     
+    @profiled("deployer.vercel_cli")
     def _run_vercel_deploy(
         self,
         deploy_dir: Path,
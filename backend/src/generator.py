@@ -5,6 +5,8 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
+from .profiling import profiled
+
 
 @dataclass
 class GeneratedService:
@@ -23,6 +25,7 @@ class ServiceGenerator:
     def __init__(self, llm_api_key: Optional[str] = None):
         self.llm_api_key = llm_api_key or os.getenv("OPENAI_API_KEY")
         
+    @profiled("generator.generate")
     def generate(self, idea: str, service_id: str) -> GeneratedService:
         """
         Generate a microservice from a user's idea.
@@ -56,11 +59,28 @@ class ServiceGenerator:
 {service_id} - Generated microservice
 User idea: {idea}
 """
-from fastapi import FastAPI, HTTPException
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
 app = FastAPI(title="{service_id}")
 
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Time each request and echo the caller's request ID for correlation."""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    started = time.perf_counter()
+    response = await call_next(request)
+    duration_ms = (time.perf_counter() - started) * 1000
+    response.headers[REQUEST_ID_HEADER] = request_id
+    response.headers["Server-Timing"] = f"app;dur={{duration_ms:.1f}}"
+    return response
+
 
 class RequestData(BaseModel):
     """Request payload for this service."""
@@ -149,6 +169,12 @@ Main processing endpoint
 ### GET /health
 Health check
 
+## Tracing
+
+Every response carries `X-Request-ID` (taken from the caller or generated) and
+a `Server-Timing: app;dur=<ms>` header. The gateway records both on its own
+request spans.
+
 ## Running Locally
 
 ```bash
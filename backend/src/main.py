@@ -1,19 +1,60 @@
+import logging
+import os
 import secrets
+from datetime import datetime
+from typing import Literal
 
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from .admission import AdmissionController, AdmissionMiddleware, default_classes
 from .analytics import load_events_from_path
 from .models import (
     AccessResponse,
+    ApiKeyVerification,
     IdeaSubmission,
     ServiceEvent,
     ServiceRecord,
     ServiceStatus,
 )
+from .profiling import (
+    ProfilingMiddleware,
+    SamplingProfiler,
+    background_sections,
+    profile_section,
+    record_background_sections,
+)
+from .serialization import FastJSONResponse, RawJSONResponse, record_encoder
 from .store import ServiceStore
-
-app = FastAPI(title="Microservice Factory API")
+from .tracing import TracingMiddleware, exporter, span
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Microservice Factory API", default_response_class=FastJSONResponse)
+
+# Worker threads available to sync handlers; admission keeps heavy endpoints
+# from taking all of them.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+admission = AdmissionController(THREADPOOL_SIZE, default_classes(THREADPOOL_SIZE))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == "1"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+SLOW_REQUEST_MS = os.getenv("SLOW_REQUEST_MS")
+ROLLUPS_WAIT_SECONDS = float(os.getenv("ROLLUPS_WAIT_SECONDS", "2"))
+profiler = SamplingProfiler(
+    interval=float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000,
+    slow_threshold=float(SLOW_REQUEST_MS) / 1000 if PROFILING_ENABLED and SLOW_REQUEST_MS else None,
+)
+if profiler.slow_threshold is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    # store.flush runs on the flusher thread, outside any request.
+    record_background_sections()
+if PROFILING_ENABLED and not ADMIN_TOKEN:
+    logger.warning("PROFILING_ENABLED is set but ADMIN_TOKEN is not; profiler endpoints stay disabled")
+if os.getenv("ADMISSION_ENABLED", "1") == "1":
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(TracingMiddleware, component="backend")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,6 +65,11 @@ app.add_middleware(
 store = ServiceStore()
 
 
+@app.on_event("startup")
+async def configure_threadpool() -> None:
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
@@ -44,16 +90,17 @@ def submit_idea(payload: IdeaSubmission) -> ServiceRecord:
 
 
 @app.get("/services", response_model=list[ServiceRecord])
-def list_services() -> list[ServiceRecord]:
-    return store.list_services()
+def list_services() -> Response:
+    # Records are already validated by the store; serve cached encodings.
+    return RawJSONResponse(record_encoder.encode_many(store.list_services()))
 
 
 @app.get("/services/{service_id}", response_model=ServiceRecord)
-def get_service(service_id: str) -> ServiceRecord:
+def get_service(service_id: str) -> Response:
     record = store.get_service(service_id)
     if record is None:
         raise HTTPException(status_code=404, detail="Service not found")
-    return record
+    return RawJSONResponse(record_encoder.encode(record))
 
 
 @app.get("/services/{service_id}/events", response_model=list[ServiceEvent])
@@ -72,7 +119,8 @@ def get_event_summary(service_id: str) -> dict[str, object]:
 
     events = store.list_events(service_id)
     if not events:
-        persisted = load_events_from_path()
+        with profile_section("analytics.load_events_from_path"):
+            persisted = load_events_from_path()
         events = persisted.get(service_id, [])
 
     counts: dict[str, int] = {}
@@ -100,12 +148,14 @@ def generate_service_code(service_id: str) -> ServiceRecord:
     store.update_status(service_id, ServiceStatus.GENERATING, "Generating service code")
     
     generator = ServiceGenerator()
-    generated = generator.generate(record.idea, service_id)
+    with span("generator.generate", "backend"):
+        generated = generator.generate(record.idea, service_id)
     
     # Store generated files (in a real system, commit to GitHub)
-    store.update_status(service_id, ServiceStatus.GENERATED, f"Code generated: {len(generated.code)} chars")
-    
-    return record
+    # Return the store's record: in lazy mode `record` may be a stale copy by now.
+    return store.update_status(
+        service_id, ServiceStatus.GENERATED, f"Code generated: {len(generated.code)} chars"
+    )
 
 
 @app.post("/services/{service_id}/deploy", response_model=ServiceRecord)
@@ -121,7 +171,8 @@ def deploy_service(service_id: str) -> ServiceRecord:
     
     # Generate service files
     generator = ServiceGenerator()
-    generated = generator.generate(record.idea, service_id)
+    with span("generator.generate", "backend"):
+        generated = generator.generate(record.idea, service_id)
     
     # Prepare files for deployment
     code_files = {
@@ -133,7 +184,9 @@ def deploy_service(service_id: str) -> ServiceRecord:
     
     # Deploy to Vercel
     deployer = ServiceDeployer()
-    result = deployer.deploy_to_vercel(service_id, code_files)
+    with span("deployer.deploy_to_vercel", "backend") as attrs:
+        result = deployer.deploy_to_vercel(service_id, code_files)
+        attrs["success"] = result.success
     
     if result.success:
         store.update_status(service_id, ServiceStatus.DEPLOYED, f"Deployed to {result.url}")
@@ -151,8 +204,7 @@ def create_token(service_id: str) -> ServiceRecord:
 
     token_address = f"0x{secrets.token_hex(20)}"
     record = store.set_token_address(service_id, token_address)
-    store.update_status(service_id, record.status, "Token created")
-    return record
+    return store.update_status(service_id, record.status, "Token created")
 
 
 @app.post("/services/{service_id}/access", response_model=AccessResponse)
@@ -173,6 +225,15 @@ def create_access(service_id: str) -> AccessResponse:
     )
 
 
+@app.post("/services/{service_id}/api-key/verify")
+def verify_api_key(service_id: str, payload: ApiKeyVerification) -> dict[str, bool]:
+    """Check an API key issued by /access; used by the gateway when minting access tokens."""
+    record = store.get_service(service_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return {"valid": store.verify_api_key(service_id, payload.api_key)}
+
+
 @app.get("/stats")
 def get_stats() -> dict[str, object]:
     """Get aggregate statistics about services in the system."""
@@ -192,6 +253,111 @@ def get_stats() -> dict[str, object]:
     }
 
 
+def require_rollups() -> None:
+    # Don't tie up a worker thread for the whole startup rebuild.
+    if not store.wait_for_rollups(ROLLUPS_WAIT_SECONDS):
+        raise HTTPException(
+            status_code=503,
+            detail="Event rollups are still being rebuilt",
+            headers={"Retry-After": "1"},
+        )
+
+
+@app.get("/analytics/timeseries")
+def get_event_timeseries(
+    resolution: Literal["minute", "hour", "day"] = "hour",
+    limit: int = Query(default=60, ge=1, le=1440),
+    until: datetime | None = None,
+) -> dict[str, object]:
+    """Event counts per status in time buckets, across all services."""
+    require_rollups()
+    return {
+        "resolution": resolution,
+        "buckets": store.rollups.timeseries(resolution, limit, until),
+    }
+
+
+@app.get("/analytics/deploy-latency")
+def get_deploy_latency() -> dict[str, object]:
+    """Approximate percentiles (seconds) of time from deploying to deployed."""
+    require_rollups()
+    return store.rollups.latency_percentiles()
+
+
+def require_admin(admin_token: str | None) -> None:
+    # Fail closed: admin endpoints are unavailable until ADMIN_TOKEN is set.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled: ADMIN_TOKEN not set")
+    if not (admin_token and secrets.compare_digest(admin_token, ADMIN_TOKEN)):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/admin/admission")
+def get_admission_stats(x_admin_token: str | None = Header(default=None)) -> dict[str, object]:
+    """Active requests, queue depth and rejection counts per admission class."""
+    require_admin(x_admin_token)
+    return admission.stats()
+
+
+def require_profiling(admin_token: str | None) -> None:
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling disabled")
+    require_admin(admin_token)
+
+
+@app.post("/admin/profiler/start")
+def start_profiler(
+    interval_ms: float | None = Query(default=None, ge=1, le=1000),
+    reset: bool = True,
+    x_admin_token: str | None = Header(default=None),
+) -> dict[str, object]:
+    """Start sampling all threads; results accumulate until stopped."""
+    require_profiling(x_admin_token)
+    if reset:
+        profiler.reset()
+    profiler.start(interval_ms / 1000 if interval_ms else None)
+    return {"running": True, "interval_ms": profiler.interval * 1000}
+
+
+@app.post("/admin/profiler/stop")
+def stop_profiler(x_admin_token: str | None = Header(default=None)) -> dict[str, object]:
+    require_profiling(x_admin_token)
+    profiler.stop()
+    return {"running": False, "samples": profiler.samples}
+
+
+@app.get("/admin/profiler/folded", response_class=PlainTextResponse)
+def get_profile_folded(x_admin_token: str | None = Header(default=None)) -> str:
+    """Sampled stacks in folded format (flamegraph.pl, speedscope)."""
+    require_profiling(x_admin_token)
+    return profiler.folded()
+
+
+@app.get("/admin/profiler/slow")
+def get_slow_requests(x_admin_token: str | None = Header(default=None)) -> dict[str, object]:
+    """
+    Recent requests over SLOW_REQUEST_MS with section timings and folded stacks,
+    plus recent sections timed outside requests (``store.flush``).
+    """
+    require_profiling(x_admin_token)
+    return {
+        "threshold_ms": SLOW_REQUEST_MS and float(SLOW_REQUEST_MS),
+        "requests": list(profiler.slow_requests),
+        "background": list(background_sections),
+    }
+
+
+@app.get("/admin/traces")
+def get_traces(
+    request_id: str | None = None,
+    limit: int = Query(default=200, ge=1, le=2000),
+    x_admin_token: str | None = Header(default=None),
+) -> dict[str, object]:
+    """Recent spans recorded by this instance, optionally for one request ID."""
+    require_admin(x_admin_token)
+    return {"spans": exporter.find(request_id, limit)}
+
+
 @app.get("/services/{service_id}/status")
 def get_service_status(service_id: str) -> dict[str, object]:
     """Get detailed status information for a service."""
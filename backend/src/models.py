@@ -44,6 +44,10 @@ class AccessResponse(BaseModel):
     token_address: str
 
 
+class ApiKeyVerification(BaseModel):
+    api_key: str = Field(min_length=1, max_length=200)
+
+
 class ServiceEvent(BaseModel):
     service_id: str
     status: ServiceStatus
@@ -0,0 +1,138 @@
+"""
+Fast JSON encoding for API responses and store persistence.
+
+Uses orjson when it is installed and falls back to the compact stdlib
+encoder otherwise, including for values orjson cannot encode (integers
+wider than 64 bits in user metadata). Persisted files are always decoded
+with the stdlib parser, which keeps such integers exact where orjson would
+turn them into floats. ServiceRecords and event lists are encoded with
+pydantic's native JSON serializer and cached until they change.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+from .models import ServiceEvent, ServiceRecord
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode a JSON-compatible payload as compact UTF-8 bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode JSON bytes or text losslessly (integers of any size stay ints)."""
+    return json.loads(data)
+
+
+def encode_object(items: dict[str, bytes]) -> bytes:
+    """Join already-encoded values into a JSON object keyed by ``items``."""
+    return b"{" + b",".join(dumps(key) + b":" + value for key, value in items.items()) + b"}"
+
+
+def encode_events(events: list[ServiceEvent]) -> bytes:
+    return b"[" + b",".join(event.model_dump_json().encode("utf-8") for event in events) + b"]"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Response for bodies that are already encoded JSON bytes."""
+
+    media_type = "application/json"
+
+
+class RecordEncoder:
+    """
+    Caches the encoded bytes of each ServiceRecord until it changes.
+
+    Every store mutation bumps ``updated_at``, so the cached bytes are reused
+    as long as the record's mutable fields are unchanged.
+    """
+
+    def __init__(self, max_size: int | None = 4096) -> None:
+        self._max_size = max_size
+        self._cache: dict[str, tuple[tuple[Any, ...], bytes]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(record: ServiceRecord) -> tuple[Any, ...]:
+        return (record.updated_at, record.status, record.token_address, record.api_base_url)
+
+    def cached(self, record: ServiceRecord) -> bytes | None:
+        """Return the cached bytes for ``record`` if it has not changed since."""
+        cached = self._cache.get(record.id)
+        if cached is not None and cached[0] == self._version(record):
+            return cached[1]
+        return None
+
+    def encode(self, record: ServiceRecord) -> bytes:
+        version = self._version(record)
+        cached = self._cache.get(record.id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        encoded = record.model_dump_json().encode("utf-8")
+        with self._lock:
+            self._cache.pop(record.id, None)
+            self._cache[record.id] = (version, encoded)
+            while self._max_size is not None and len(self._cache) > self._max_size:
+                self._cache.pop(next(iter(self._cache)))
+        return encoded
+
+    def encode_many(self, records: list[ServiceRecord]) -> bytes:
+        return b"[" + b",".join(self.encode(record) for record in records) + b"]"
+
+
+class EventListEncoder:
+    """
+    Caches the encoded bytes of each service's event list until it changes.
+
+    Event lists only ever grow, so an entry is identified by the list's length
+    and its last event. After an append only the new events are encoded and
+    joined onto the cached bytes.
+    """
+
+    def __init__(self) -> None:
+        self._cache: dict[str, tuple[int, ServiceEvent, bytes]] = {}
+
+    def cached(self, service_id: str, events: list[ServiceEvent]) -> bytes | None:
+        """Return the cached bytes for ``events`` if nothing was appended since."""
+        cached = self._cache.get(service_id)
+        if cached is not None and cached[0] == len(events) > 0 and events[-1] is cached[1]:
+            return cached[2]
+        return None
+
+    def encode(self, service_id: str, events: list[ServiceEvent]) -> bytes:
+        if not events:
+            return b"[]"
+        cached = self._cache.get(service_id)
+        if cached is not None and cached[0] <= len(events) and events[cached[0] - 1] is cached[1]:
+            if cached[0] == len(events):
+                return cached[2]
+            encoded = cached[2][:-1] + b"," + encode_events(events[cached[0]:])[1:]
+        else:
+            encoded = encode_events(events)
+        self._cache[service_id] = (len(events), events[-1], encoded)
+        return encoded
+
+
+record_encoder = RecordEncoder()
@@ -0,0 +1,225 @@
+"""
+Memory-mapped store snapshots - lazy loading of persisted records.
+
+A snapshot is a compact data file holding one JSON document per service
+record and per service event list, plus a small index file mapping each
+service id to the byte offset and length of its documents. At startup the
+store only reads the index and maps the data file; records are decoded on
+first access and kept in a bounded LRU cache.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from collections import OrderedDict
+from collections.abc import Callable, Iterator, MutableMapping
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+SNAPSHOT_VERSION = 1
+
+T = TypeVar("T")
+
+
+def source_fingerprint(paths: list[Path]) -> dict[str, list[int]]:
+    """Return the (mtime_ns, size) of each existing source file."""
+    fingerprint: dict[str, list[int]] = {}
+    for path in paths:
+        if path.exists():
+            stat = path.stat()
+            fingerprint[str(path)] = [stat.st_mtime_ns, stat.st_size]
+    return fingerprint
+
+
+def write_snapshot(
+    snapshot_path: Path,
+    index_path: Path,
+    services: dict[str, bytes],
+    events: dict[str, bytes],
+    api_keys: dict[str, str],
+    sources: dict[str, list[int]],
+) -> None:
+    """
+    Write a snapshot data file and its offset index.
+
+    Args:
+        snapshot_path: Destination of the data file
+        index_path: Destination of the offset index
+        services: Service id -> encoded ServiceRecord document
+        events: Service id -> encoded list of ServiceEvent documents
+        api_keys: Service id -> API key
+        sources: Fingerprint of the JSON files the snapshot was built from
+    """
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    index: dict[str, Any] = {
+        "version": SNAPSHOT_VERSION,
+        "sources": sources,
+        "services": {},
+        "events": {},
+        "api_keys": api_keys,
+    }
+    tmp_snapshot = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.tmp")
+    offset = 0
+    with tmp_snapshot.open("wb") as handle:
+        for kind, documents in (("services", services), ("events", events)):
+            for service_id, document in documents.items():
+                handle.write(document)
+                index[kind][service_id] = [offset, len(document)]
+                offset += len(document)
+    tmp_index = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    tmp_index.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+    # Data first, index last: an index never points into a missing file.
+    os.replace(tmp_snapshot, snapshot_path)
+    os.replace(tmp_index, index_path)
+
+
+class Snapshot:
+    """A read-only, memory-mapped snapshot opened from disk."""
+
+    def __init__(self, data: mmap.mmap | bytes, index: dict[str, Any]) -> None:
+        self._data = data
+        self.services: dict[str, list[int]] = index.get("services", {})
+        self.events: dict[str, list[int]] = index.get("events", {})
+        self.api_keys: dict[str, str] = index.get("api_keys", {})
+
+    @classmethod
+    def open(
+        cls,
+        snapshot_path: Path,
+        index_path: Path,
+        sources: dict[str, list[int]],
+    ) -> Snapshot | None:
+        """Open a snapshot, or return None if it is missing or stale."""
+        if not snapshot_path.exists() or not index_path.exists():
+            return None
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+        if index.get("version") != SNAPSHOT_VERSION or index.get("sources") != sources:
+            return None
+        with snapshot_path.open("rb") as handle:
+            if snapshot_path.stat().st_size == 0:
+                return cls(b"", index)
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, index)
+
+    def read(self, entry: list[int]) -> bytes:
+        offset, length = entry
+        return self._data[offset : offset + length]
+
+
+class LazyRecordMap(MutableMapping[str, T], Generic[T]):
+    """
+    Mapping that decodes snapshot documents on first access.
+
+    Decoded values live in a bounded LRU cache. Values written through
+    ``__setitem__`` are pinned in memory until a ``rebase`` onto a snapshot
+    that contains them, so that mutations are never lost to eviction.
+    The map itself is not thread-safe; callers serialize access.
+    """
+
+    def __init__(
+        self,
+        snapshot: Snapshot | None,
+        entries: dict[str, list[int]],
+        decoder: Callable[[bytes], T],
+        encoder: Callable[[T], bytes],
+        cache_size: int = 1024,
+    ) -> None:
+        self._snapshot = snapshot
+        self._entries = entries
+        self._decoder = decoder
+        self._encoder = encoder
+        self._cache_size = max(cache_size, 0)
+        self._cache: OrderedDict[str, T] = OrderedDict()
+        self._dirty: dict[str, T] = {}
+        self._dirty_seq: dict[str, int] = {}
+        self._seq = 0
+
+    def __getitem__(self, key: str) -> T:
+        if key in self._dirty:
+            return self._dirty[key]
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key not in self._entries or self._snapshot is None:
+            raise KeyError(key)
+        value = self._decoder(self._snapshot.read(self._entries[key]))
+        if self._cache_size:
+            self._cache[key] = value
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def __setitem__(self, key: str, value: T) -> None:
+        self._cache.pop(key, None)
+        self._seq += 1
+        self._dirty[key] = value
+        self._dirty_seq[key] = self._seq
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self._dirty.pop(key, None)
+        self._dirty_seq.pop(key, None)
+        self._entries.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._dirty or key in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._entries
+        for key in self._dirty:
+            if key not in self._entries:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._entries) + sum(
+            1 for key in self._dirty if key not in self._entries
+        )
+
+    def peek(self, key: str) -> T | bytes:
+        """
+        Return the value written for a key, or its snapshot document.
+
+        Keys that were not written since the last ``rebase`` come back as the
+        encoded bytes from the snapshot, without decoding them.
+        """
+        if key in self._dirty:
+            return self._dirty[key]
+        if self._snapshot is not None and key in self._entries:
+            return self._snapshot.read(self._entries[key])
+        raise KeyError(key)
+
+    def encode(self, key: str) -> bytes:
+        """Return the compact JSON document for a key without decoding it."""
+        value = self.peek(key)
+        return value if isinstance(value, bytes) else self._encoder(value)
+
+    def mark(self) -> int:
+        """Return a marker for the writes captured so far, for ``rebase``."""
+        return self._seq
+
+    def rebase(
+        self,
+        snapshot: Snapshot,
+        entries: dict[str, list[int]],
+        mark: int | None = None,
+    ) -> None:
+        """
+        Point at a freshly written snapshot and release pinned values.
+
+        Only values written at or before ``mark`` are released; anything
+        written after the snapshot was captured stays pinned.
+        """
+        self._snapshot = snapshot
+        self._entries = entries
+        for key in list(self._dirty):
+            if mark is None or self._dirty_seq[key] <= mark:
+                self._cache[key] = self._dirty.pop(key)
+                del self._dirty_seq[key]
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
@@ -1,31 +1,236 @@
 from __future__ import annotations
 
-import json
+import atexit
+import logging
 import os
 import secrets
+import tempfile
+import threading
+import time
 import uuid
+from collections.abc import MutableMapping
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+from pydantic import TypeAdapter
+
+from .analytics import EventRollups
 from .models import ServiceEvent, ServiceRecord, ServiceStatus
+from .profiling import profile_section
+from .serialization import (
+    EventListEncoder,
+    RecordEncoder,
+    dumps,
+    encode_events,
+    encode_object,
+    loads,
+    record_encoder,
+)
+from .snapshot import LazyRecordMap, Snapshot, source_fingerprint, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Read once at import: os.umask can only be queried by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Store lock files held by this process, kept open for the process lifetime.
+_held_locks: dict[Path, int] = {}
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_SHARD_COUNT = 16
+DEFAULT_FLUSH_INTERVAL = 0.05
 
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+_event_list_adapter = TypeAdapter(list[ServiceEvent])
+
+
+def _events_from_payload(payload: list[dict[str, Any]]) -> list[ServiceEvent]:
+    return [ServiceEvent(**event) for event in payload]
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Write a file via temp file + rename so readers never see a partial write."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates files as 0600; keep the mode a plain open() would give.
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _lock_store_file(path: Path) -> None:
+    """
+    Take an exclusive, process-wide lock on a store file.
+
+    Each process keeps the whole store in memory and rewrites the files from
+    it, so two processes sharing a file would silently overwrite each
+    other's changes.
+
+    Raises:
+        RuntimeError: If another process already uses the file
+    """
+    if fcntl is None:
+        return
+    lock_path = path.resolve().with_name(path.name + ".lock")
+    if lock_path in _held_locks:
+        return
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        raise RuntimeError(
+            f"{path} is already used by another process. The backend keeps its "
+            "store in memory and must run as a single worker process."
+        ) from None
+    _held_locks[lock_path] = fd
+
+
+class _Shard:
+    """A slice of the store owning the services whose id hashes to it."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.services: MutableMapping[str, ServiceRecord] = {}
+        self.events: MutableMapping[str, list[ServiceEvent]] = {}
+        self.api_keys: dict[str, str] = {}
+        # Encoded documents reused across flushes of an in-memory shard. A lazy
+        # shard reads unchanged documents straight from its snapshot instead.
+        self.record_encoder = RecordEncoder(max_size=None)
+        self.event_encoder = EventListEncoder()
+
+    def capture(self) -> tuple[dict[str, Any], dict[str, Any], dict[str, str]]:
+        """
+        Copy this shard's data for a flush. Caller holds the lock.
+
+        Values are encoded bytes where they are cached and copies otherwise;
+        ``encode`` finishes the JSON work once the lock is released.
+        """
+        services: dict[str, Any] = {}
+        events: dict[str, Any] = {}
+        if isinstance(self.services, LazyRecordMap):
+            for key in self.services:
+                value = self.services.peek(key)
+                services[key] = value if isinstance(value, bytes) else value.model_copy()
+        else:
+            for key, record in self.services.items():
+                services[key] = self.record_encoder.cached(record) or record.model_copy()
+        if isinstance(self.events, LazyRecordMap):
+            for key in self.events:
+                value = self.events.peek(key)
+                events[key] = value if isinstance(value, bytes) else list(value)
+        else:
+            for key, event_list in self.events.items():
+                events[key] = self.event_encoder.cached(key, event_list) or list(event_list)
+        return services, events, dict(self.api_keys)
+
+    def encode(
+        self, services: dict[str, Any], events: dict[str, Any]
+    ) -> tuple[dict[str, bytes], dict[str, bytes]]:
+        """Encode the copies taken by ``capture``. Runs without the lock."""
+        lazy = isinstance(self.services, LazyRecordMap)
+        for key, value in services.items():
+            if not isinstance(value, bytes):
+                services[key] = (
+                    record_encoder.encode(value) if lazy else self.record_encoder.encode(value)
+                )
+        for key, value in events.items():
+            if not isinstance(value, bytes):
+                events[key] = (
+                    encode_events(value) if lazy else self.event_encoder.encode(key, value)
+                )
+        return services, events
+
+
 class ServiceStore:
+    """
+    Service registry sharded by service id.
+
+    Each shard has its own lock, so handlers running in FastAPI's threadpool
+    only contend when they touch services in the same shard. Mutations mark
+    the store dirty and a single background flusher thread coalesces them
+    into one atomic write of the JSON files.
+    """
+
     def __init__(self) -> None:
-        self._services: dict[str, ServiceRecord] = {}
-        self._api_keys: dict[str, str] = {}
-        self._events: dict[str, list[ServiceEvent]] = {}
+        started = time.perf_counter()
+        shard_count = max(int(os.getenv("SERVICE_STORE_SHARDS", str(DEFAULT_SHARD_COUNT))), 1)
+        self._shards = [_Shard() for _ in range(shard_count)]
         self._data_path = self._resolve_data_path()
         self._events_path = self._resolve_events_path()
-        if self._data_path:
-            self._load_from_disk()
-        if self._events_path:
-            self._load_events()
+        self._snapshot_path = self._resolve_snapshot_path()
+        for path in (self._data_path, self._events_path):
+            if path:
+                _lock_store_file(path)
+        self._lazy = self._snapshot_path is not None and os.getenv(
+            "SERVICE_STORE_LAZY", ""
+        ).lower() in {"1", "true", "yes"}
+        self._rollups_path = self._resolve_rollups_path()
+        self._rollups_ready = threading.Event()
+        self.rollups = self._read_rollups()
+        self._flush_lock = threading.Lock()
+        snapshot: Snapshot | None = None
+        if self._lazy:
+            snapshot = self._open_snapshot()
+        else:
+            if self._data_path:
+                self._load_from_disk()
+            if self._events_path:
+                self._load_events()
+
+        self._flush_interval = float(
+            os.getenv("SERVICE_STORE_FLUSH_INTERVAL", str(DEFAULT_FLUSH_INTERVAL))
+        )
+        self._flush_pending = threading.Event()
+        self._closed = False
+        self._flusher: threading.Thread | None = None
+        if self._persistent and self._flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="service-store-flusher", daemon=True
+            )
+            self._flusher.start()
+            atexit.register(self.close)
+
+        self.startup_seconds = time.perf_counter() - started
+        logger.info(
+            "ServiceStore ready in %.1f ms (%d services, %d shards, lazy=%s)",
+            self.startup_seconds * 1000,
+            sum(len(shard.services) for shard in self._shards),
+            shard_count,
+            self._lazy,
+        )
+        if not self._rollups_ready.is_set():
+            self._rebuild_rollups(snapshot)
+
+    @property
+    def _persistent(self) -> bool:
+        return self._data_path is not None or self._events_path is not None
+
+    def _shard(self, service_id: str) -> _Shard:
+        return self._shards[hash(service_id) % len(self._shards)]
 
     def _resolve_data_path(self) -> Path | None:
         path = os.getenv("SERVICE_STORE_PATH")
@@ -39,57 +244,285 @@ class ServiceStore:
             return None
         return Path(path)
 
+    def _resolve_snapshot_path(self) -> Path | None:
+        path = os.getenv("SERVICE_SNAPSHOT_PATH")
+        if path:
+            return Path(path)
+        source = self._data_path or self._events_path
+        if not source:
+            return None
+        return source.with_name(source.name + ".snapshot")
+
+    def _resolve_rollups_path(self) -> Path | None:
+        path = os.getenv("SERVICE_ROLLUPS_PATH")
+        if path:
+            return Path(path)
+        source = self._data_path or self._events_path
+        if not source:
+            return None
+        return source.with_name(source.name + ".rollups")
+
+    def _read_rollups(self) -> EventRollups:
+        """Load persisted rollups; leaves ``_rollups_ready`` unset if they need a rebuild."""
+        if self._rollups_path and self._rollups_path.exists():
+            payload = loads(self._rollups_path.read_bytes())
+            if payload.get("sources") == self._snapshot_sources():
+                self._rollups_ready.set()
+                return EventRollups.from_json(payload)
+        if not self._persistent:
+            self._rollups_ready.set()
+        return EventRollups()
+
+    def _rebuild_rollups(self, snapshot: Snapshot | None) -> None:
+        """Rebuild missing or stale rollups once from the stored events."""
+        logger.info("Rebuilding event rollups from stored events")
+        if not self._lazy:
+            # Eager mode has already decoded every event.
+            events: list[ServiceEvent] = []
+            for shard in self._shards:
+                for service_id in list(shard.events):
+                    events.extend(shard.events[service_id])
+            self._set_rebuilt_rollups(EventRollups.from_events(events))
+            return
+        # Keep lazy startup lazy: scan the snapshot off the startup path.
+        # Events recorded meanwhile go into the live rollups and are merged.
+        threading.Thread(
+            target=self._rebuild_rollups_from_snapshot,
+            args=(snapshot,),
+            name="service-store-rollups",
+            daemon=True,
+        ).start()
+
+    def _rebuild_rollups_from_snapshot(self, snapshot: Snapshot | None) -> None:
+        try:
+            rebuilt = EventRollups.from_payloads(
+                event
+                for entry in (snapshot.events.values() if snapshot else ())
+                for event in loads(snapshot.read(entry))
+            )
+            self.rollups.merge(rebuilt)
+        except Exception:
+            logger.exception("Rebuilding event rollups failed")
+        finally:
+            # Analytics requests wait on this; never leave them blocked.
+            self._set_rebuilt_rollups(self.rollups)
+
+    def _set_rebuilt_rollups(self, rollups: EventRollups) -> None:
+        self.rollups = rollups
+        try:
+            with self._flush_lock:
+                self._write_rollups()
+        finally:
+            self._rollups_ready.set()
+
+    def _write_rollups(self) -> None:
+        """Persist the rollups. Caller holds the flush lock during normal operation."""
+        if not self._rollups_path:
+            return
+        rollups = self.rollups.to_json()
+        rollups["sources"] = self._snapshot_sources()
+        _atomic_write(self._rollups_path, dumps(rollups))
+
+    def wait_for_rollups(self, timeout: float | None = None) -> bool:
+        """Block until rollups rebuilt at startup have caught up with stored events."""
+        return self._rollups_ready.wait(timeout)
+
+    @property
+    def _index_path(self) -> Path:
+        assert self._snapshot_path is not None
+        return self._snapshot_path.with_name(self._snapshot_path.name + ".idx")
+
+    def _snapshot_sources(self) -> dict[str, list[int]]:
+        return source_fingerprint(
+            [path for path in (self._data_path, self._events_path) if path]
+        )
+
+    def _split_entries(self, entries: dict[str, Any]) -> list[dict[str, Any]]:
+        split: list[dict[str, Any]] = [{} for _ in self._shards]
+        for service_id, entry in entries.items():
+            split[hash(service_id) % len(self._shards)][service_id] = entry
+        return split
+
+    def _open_snapshot(self) -> Snapshot | None:
+        assert self._snapshot_path is not None
+        snapshot = Snapshot.open(
+            self._snapshot_path, self._index_path, self._snapshot_sources()
+        )
+        if snapshot is None:
+            self._build_snapshot_from_sources()
+            snapshot = Snapshot.open(
+                self._snapshot_path, self._index_path, self._snapshot_sources()
+            )
+        cache_size = int(
+            os.getenv("SERVICE_STORE_CACHE_SIZE", str(DEFAULT_CACHE_SIZE))
+        )
+        shard_cache_size = max(cache_size // len(self._shards), 1)
+        services = self._split_entries(snapshot.services if snapshot else {})
+        events = self._split_entries(snapshot.events if snapshot else {})
+        api_keys = self._split_entries(snapshot.api_keys if snapshot else {})
+        for index, shard in enumerate(self._shards):
+            shard.services = LazyRecordMap(
+                snapshot,
+                services[index],
+                ServiceRecord.model_validate_json,
+                record_encoder.encode,
+                shard_cache_size,
+            )
+            shard.events = LazyRecordMap(
+                snapshot,
+                events[index],
+                _event_list_adapter.validate_json,
+                encode_events,
+                shard_cache_size,
+            )
+            shard.api_keys = api_keys[index]
+        return snapshot
+
+    def _build_snapshot_from_sources(self) -> None:
+        """Convert the JSON store files into a snapshot without building models."""
+        assert self._snapshot_path is not None
+        services: dict[str, Any] = {}
+        events: dict[str, Any] = {}
+        api_keys: dict[str, str] = {}
+        if self._data_path and self._data_path.exists():
+            data = loads(self._data_path.read_bytes())
+            services = data.get("services", {})
+            events = data.get("events", {})
+            api_keys = data.get("api_keys", {})
+        if self._events_path and self._events_path.exists():
+            events.update(loads(self._events_path.read_bytes()))
+        if not self._rollups_ready.is_set():
+            # The events are already decoded here, so rebuilding costs one pass.
+            self.rollups = EventRollups.from_payloads(
+                event for service_events in events.values() for event in service_events
+            )
+            self._write_rollups()
+            self._rollups_ready.set()
+        write_snapshot(
+            self._snapshot_path,
+            self._index_path,
+            {service_id: dumps(payload) for service_id, payload in services.items()},
+            {service_id: dumps(payload) for service_id, payload in events.items()},
+            api_keys,
+            self._snapshot_sources(),
+        )
+
     def _load_from_disk(self) -> None:
         if not self._data_path or not self._data_path.exists():
             return
-        data = json.loads(self._data_path.read_text(encoding="utf-8"))
-        self._services = {
-            service_id: ServiceRecord(**payload)
-            for service_id, payload in data.get("services", {}).items()
-        }
-        self._events = {
-            service_id: [ServiceEvent(**event) for event in events]
-            for service_id, events in data.get("events", {}).items()
-        }
-        self._api_keys = data.get("api_keys", {})
+        data = loads(self._data_path.read_bytes())
+        for service_id, payload in data.get("services", {}).items():
+            self._shard(service_id).services[service_id] = ServiceRecord(**payload)
+        for service_id, events in data.get("events", {}).items():
+            self._shard(service_id).events[service_id] = _events_from_payload(events)
+        for service_id, api_key in data.get("api_keys", {}).items():
+            self._shard(service_id).api_keys[service_id] = api_key
 
     def _load_events(self) -> None:
         if not self._events_path or not self._events_path.exists():
             return
-        data = json.loads(self._events_path.read_text(encoding="utf-8"))
+        data = loads(self._events_path.read_bytes())
         for service_id, events in data.items():
-            self._events[service_id] = [ServiceEvent(**event) for event in events]
+            self._shard(service_id).events[service_id] = _events_from_payload(events)
 
-    def _persist_to_disk(self) -> None:
-        if not self._data_path:
+    def _schedule_flush(self) -> None:
+        if not self._persistent:
             return
-        self._data_path.parent.mkdir(parents=True, exist_ok=True)
-        payload = {
-            "services": {
-                service_id: record.model_dump(mode="json")
-                for service_id, record in self._services.items()
-            },
-            "events": {
-                service_id: [event.model_dump(mode="json") for event in events]
-                for service_id, events in self._events.items()
-            },
-            "api_keys": self._api_keys,
-        }
-        self._data_path.write_text(
-            json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8"
-        )
+        if self._flusher is None:
+            self.flush()
+        else:
+            self._flush_pending.set()
 
-    def _persist_events(self) -> None:
-        if not self._events_path:
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._flush_pending.wait()
+            if self._closed:
+                break
+            # Let a burst of writes land before paying for one full rewrite.
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("ServiceStore flush failed")
+
+    def flush(self) -> None:
+        """Persist the current state to disk. Safe to call from any thread."""
+        if not self._persistent:
             return
-        self._events_path.parent.mkdir(parents=True, exist_ok=True)
-        payload = {
-            service_id: [event.model_dump(mode="json") for event in events]
-            for service_id, events in self._events.items()
-        }
-        self._events_path.write_text(
-            json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8"
+        with self._flush_lock, profile_section("store.flush"):
+            self._flush_pending.clear()
+            services: dict[str, bytes] = {}
+            events: dict[str, bytes] = {}
+            api_keys: dict[str, str] = {}
+            marks: list[tuple[int, int]] = []
+            for shard in self._shards:
+                with shard.lock:
+                    shard_services, shard_events, shard_api_keys = shard.capture()
+                    if self._lazy:
+                        assert isinstance(shard.services, LazyRecordMap)
+                        assert isinstance(shard.events, LazyRecordMap)
+                        marks.append((shard.services.mark(), shard.events.mark()))
+                shard_services, shard_events = shard.encode(shard_services, shard_events)
+                services.update(shard_services)
+                events.update(shard_events)
+                api_keys.update(shard_api_keys)
+
+            if self._data_path:
+                payload = encode_object(
+                    {
+                        "services": encode_object(services),
+                        "events": encode_object(events),
+                        "api_keys": dumps(api_keys),
+                    }
+                )
+                _atomic_write(self._data_path, payload)
+            if self._events_path:
+                _atomic_write(self._events_path, encode_object(events))
+            # Rollups still being rebuilt are written once the rebuild finishes.
+            if self._rollups_ready.is_set():
+                self._write_rollups()
+            if self._lazy:
+                self._refresh_snapshot(services, events, api_keys, marks)
+
+    def _refresh_snapshot(
+        self,
+        services: dict[str, bytes],
+        events: dict[str, bytes],
+        api_keys: dict[str, str],
+        marks: list[tuple[int, int]],
+    ) -> None:
+        """Rewrite the snapshot after a flush so the next boot can map it."""
+        assert self._snapshot_path is not None
+        write_snapshot(
+            self._snapshot_path,
+            self._index_path,
+            services,
+            events,
+            api_keys,
+            self._snapshot_sources(),
         )
+        snapshot = Snapshot.open(
+            self._snapshot_path, self._index_path, self._snapshot_sources()
+        )
+        if snapshot is None:
+            return
+        service_entries = self._split_entries(snapshot.services)
+        event_entries = self._split_entries(snapshot.events)
+        for index, shard in enumerate(self._shards):
+            services_mark, events_mark = marks[index]
+            with shard.lock:
+                assert isinstance(shard.services, LazyRecordMap)
+                assert isinstance(shard.events, LazyRecordMap)
+                shard.services.rebase(snapshot, service_entries[index], services_mark)
+                shard.events.rebase(snapshot, event_entries[index], events_mark)
+
+    def close(self) -> None:
+        """Stop the flusher thread and write any pending changes."""
+        self._closed = True
+        self._flush_pending.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
 
     def create_service(
         self,
@@ -105,52 +538,85 @@ class ServiceStore:
             metadata=metadata,
             status=ServiceStatus.QUEUED,
         )
-        self._services[service_id] = record
-        self._events[service_id] = [
-            ServiceEvent(service_id=service_id, status=ServiceStatus.QUEUED)
-        ]
-        self._persist_to_disk()
-        self._persist_events()
+        event = ServiceEvent(service_id=service_id, status=ServiceStatus.QUEUED)
+        shard = self._shard(service_id)
+        with shard.lock:
+            shard.services[service_id] = record
+            shard.events[service_id] = [event]
+        self.rollups.record(event)
+        self._schedule_flush()
         return record
 
     def list_services(self) -> list[ServiceRecord]:
-        return list(self._services.values())
+        records: list[ServiceRecord] = []
+        for shard in self._shards:
+            with shard.lock:
+                records.extend(shard.services.values())
+        records.sort(key=lambda record: record.created_at)
+        return records
 
     def get_service(self, service_id: str) -> ServiceRecord | None:
-        return self._services.get(service_id)
+        shard = self._shard(service_id)
+        with shard.lock:
+            return shard.services.get(service_id)
 
     def update_status(
         self, service_id: str, status: ServiceStatus, message: str | None = None
     ) -> ServiceRecord:
-        record = self._services[service_id]
-        record.status = status
-        record.updated_at = utc_now()
-        self._events[service_id].append(
-            ServiceEvent(service_id=service_id, status=status, message=message)
-        )
-        self._persist_to_disk()
-        self._persist_events()
+        shard = self._shard(service_id)
+        with profile_section("store.update_status"), shard.lock:
+            record = shard.services[service_id]
+            record.status = status
+            record.updated_at = utc_now()
+            shard.services[service_id] = record
+            event = ServiceEvent(service_id=service_id, status=status, message=message)
+            events = shard.events.get(service_id, [])
+            events.append(event)
+            shard.events[service_id] = events
+        self.rollups.record(event)
+        self._schedule_flush()
         return record
 
     def list_events(self, service_id: str) -> list[ServiceEvent]:
-        return list(self._events.get(service_id, []))
+        shard = self._shard(service_id)
+        with shard.lock:
+            return list(shard.events.get(service_id, []))
 
     def set_api_base_url(self, service_id: str, url: str) -> ServiceRecord:
-        record = self._services[service_id]
-        record.api_base_url = url
-        record.updated_at = utc_now()
-        self._persist_to_disk()
+        shard = self._shard(service_id)
+        with shard.lock:
+            record = shard.services[service_id]
+            record.api_base_url = url
+            record.updated_at = utc_now()
+            shard.services[service_id] = record
+        self._schedule_flush()
         return record
 
     def set_token_address(self, service_id: str, token_address: str) -> ServiceRecord:
-        record = self._services[service_id]
-        record.token_address = token_address
-        record.updated_at = utc_now()
-        self._persist_to_disk()
+        shard = self._shard(service_id)
+        with shard.lock:
+            record = shard.services[service_id]
+            record.token_address = token_address
+            record.updated_at = utc_now()
+            shard.services[service_id] = record
+        self._schedule_flush()
         return record
 
     def ensure_api_key(self, service_id: str) -> str:
-        if service_id not in self._api_keys:
-            self._api_keys[service_id] = secrets.token_urlsafe(32)
-            self._persist_to_disk()
-        return self._api_keys[service_id]
+        shard = self._shard(service_id)
+        with shard.lock:
+            api_key = shard.api_keys.get(service_id)
+            if api_key is None:
+                api_key = shard.api_keys[service_id] = secrets.token_urlsafe(32)
+                created = True
+            else:
+                created = False
+        if created:
+            self._schedule_flush()
+        return api_key
+
+    def verify_api_key(self, service_id: str, api_key: str) -> bool:
+        shard = self._shard(service_id)
+        with shard.lock:
+            expected = shard.api_keys.get(service_id)
+        return expected is not None and secrets.compare_digest(expected, api_key)
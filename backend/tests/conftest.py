@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Import the app as `src.*`, the same way uvicorn loads it from backend/.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+STORE_ENV = (
+    "SERVICE_STORE_PATH",
+    "SERVICE_EVENTS_PATH",
+    "SERVICE_SNAPSHOT_PATH",
+    "SERVICE_ROLLUPS_PATH",
+    "SERVICE_STORE_LAZY",
+    "SERVICE_STORE_CACHE_SIZE",
+    "SERVICE_STORE_SHARDS",
+    "SERVICE_STORE_FLUSH_INTERVAL",
+)
+
+
+@pytest.fixture
+def store_env(tmp_path, monkeypatch):
+    """Point ServiceStore at a fresh store file; returns a setter for extra env vars."""
+    for name in STORE_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("SERVICE_STORE_PATH", str(tmp_path / "store.json"))
+
+    def configure(**env: str) -> None:
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+
+    return configure
@@ -0,0 +1,88 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from src.models import ServiceStatus
+from src.store import ServiceStore
+
+
+def lazy_store(store_env) -> ServiceStore:
+    # One cached record per shard and synchronous flushes, so held records go stale fast.
+    store_env(
+        SERVICE_STORE_LAZY="1",
+        SERVICE_STORE_CACHE_SIZE="16",
+        SERVICE_STORE_FLUSH_INTERVAL="0",
+    )
+    return ServiceStore()
+
+
+def test_mutations_survive_eviction_and_rebase(store_env) -> None:
+    store = lazy_store(store_env)
+    ids = [store.create_service(f"service {index}").id for index in range(64)]
+    for service_id in ids:
+        store.update_status(service_id, ServiceStatus.GENERATING)
+        store.set_token_address(service_id, "0x" + "a" * 40)
+
+    for service_id in ids:
+        record = store.get_service(service_id)
+        assert record is not None
+        assert record.status == ServiceStatus.GENERATING
+        assert record.token_address == "0x" + "a" * 40
+        assert len(store.list_events(service_id)) == 2
+
+    reloaded = lazy_store(store_env)
+    assert {record.id for record in reloaded.list_services()} == set(ids)
+    assert all(record.status == ServiceStatus.GENERATING for record in reloaded.list_services())
+
+
+def test_generate_returns_the_current_record(store_env, monkeypatch) -> None:
+    from src import generator, main
+
+    store = lazy_store(store_env)
+    monkeypatch.setattr(main, "store", store)
+    others = [store.create_service(f"other {index}").id for index in range(64)]
+    generate = generator.ServiceGenerator.generate
+
+    def generate_under_load(self, idea, service_id):
+        # Concurrent traffic evicts the handler's record from the shard caches.
+        for other in others:
+            store.get_service(other)
+        return generate(self, idea, service_id)
+
+    monkeypatch.setattr(generator.ServiceGenerator, "generate", generate_under_load)
+    client = TestClient(main.app)
+    service_id = client.post("/ideas", json={"idea": "summarize web pages"}).json()["id"]
+
+    response = client.post(f"/services/{service_id}/generate")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == ServiceStatus.GENERATED.value
+    assert response.json() == client.get(f"/services/{service_id}").json()
+
+
+def test_failed_rollups_rebuild_still_releases_waiters(store_env, tmp_path, monkeypatch) -> None:
+    from src import analytics
+
+    lazy_store(store_env).create_service("one event")
+    (tmp_path / "store.json.rollups").unlink()
+
+    def broken_merge(self, older):
+        raise RuntimeError("merge failed")
+
+    monkeypatch.setattr(analytics.EventRollups, "merge", broken_merge)
+    store = ServiceStore()
+
+    assert store.wait_for_rollups(timeout=5)
+
+
+def test_analytics_return_503_while_rollups_rebuild(monkeypatch) -> None:
+    from src import main
+
+    monkeypatch.setattr(main.store, "_rollups_ready", threading.Event())
+    monkeypatch.setattr(main, "ROLLUPS_WAIT_SECONDS", 0.01)
+    client = TestClient(main.app)
+
+    for path in ("/analytics/timeseries", "/analytics/deploy-latency"):
+        response = client.get(path)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
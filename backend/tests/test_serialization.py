@@ -0,0 +1,33 @@
+from fastapi.testclient import TestClient
+
+from src.serialization import dumps, loads
+from src.store import ServiceStore
+
+BIG = 123456789012345678901234567890
+
+
+def test_dumps_and_loads_keep_wide_integers_exact() -> None:
+    payload = {"n": BIG, "neg": -(2**70), "small": 1}
+    assert loads(dumps(payload)) == payload
+    assert isinstance(loads(dumps(payload))["n"], int)
+
+
+def test_wide_integers_survive_a_restart(store_env) -> None:
+    for lazy in ("0", "1"):
+        store_env(SERVICE_STORE_LAZY=lazy, SERVICE_STORE_FLUSH_INTERVAL="0")
+        record = ServiceStore().create_service("big numbers", metadata={"n": BIG})
+
+        reloaded = ServiceStore().get_service(record.id)
+
+        assert reloaded is not None
+        assert reloaded.metadata == {"n": BIG}
+
+
+def test_post_ideas_accepts_wide_integers() -> None:
+    from src.main import app
+
+    client = TestClient(app)
+    response = client.post("/ideas", json={"idea": "big numbers", "metadata": {"n": BIG}})
+
+    assert response.status_code == 200
+    assert response.json()["metadata"] == {"n": BIG}
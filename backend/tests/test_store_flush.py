@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from src.models import ServiceStatus
+from src.store import ServiceStore
+
+THREADS = 16
+SERVICES_PER_THREAD = 20
+UPDATES_PER_SERVICE = 5
+
+
+@pytest.mark.parametrize("lazy", ["0", "1"])
+def test_concurrent_writes_survive_background_flushes(store_env, lazy, caplog) -> None:
+    # Small caches and a busy flusher, so flushes keep interleaving with writes.
+    store_env(
+        SERVICE_STORE_LAZY=lazy,
+        SERVICE_STORE_CACHE_SIZE="16",
+        SERVICE_STORE_FLUSH_INTERVAL="0.001",
+    )
+    store = ServiceStore()
+    created: list[list[str]] = [[] for _ in range(THREADS)]
+    errors: list[BaseException] = []
+
+    def writer(index: int) -> None:
+        try:
+            for number in range(SERVICES_PER_THREAD):
+                service_id = store.create_service(f"writer {index} service {number}").id
+                created[index].append(service_id)
+                for _ in range(UPDATES_PER_SERVICE):
+                    store.update_status(service_id, ServiceStatus.GENERATING)
+                store.update_status(service_id, ServiceStatus.DEPLOYED, "done")
+                assert len(store.list_events(service_id)) == UPDATES_PER_SERVICE + 2
+        except BaseException as exc:  # surfaced in the main thread below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    assert errors == []
+    assert not [record for record in caplog.records if record.levelname == "ERROR"]
+    service_ids = {service_id for ids in created for service_id in ids}
+    assert len(service_ids) == THREADS * SERVICES_PER_THREAD
+
+    reloaded = ServiceStore()
+    assert {record.id for record in reloaded.list_services()} == service_ids
+    for service_id in service_ids:
+        record = reloaded.get_service(service_id)
+        assert record is not None and record.status == ServiceStatus.DEPLOYED
+        events = reloaded.list_events(service_id)
+        assert [event.status for event in events] == (
+            [ServiceStatus.QUEUED]
+            + [ServiceStatus.GENERATING] * UPDATES_PER_SERVICE
+            + [ServiceStatus.DEPLOYED]
+        )
+    reloaded.close()
@@ -0,0 +1,69 @@
+"""
+Stateless, HMAC-signed access tokens for the gateway.
+
+A token binds a wallet to one service for a short time. It is minted after a
+single balance check and verified with nothing but the shared secret, so
+steady-state authorized requests need no backend or RPC call.
+
+Format: ``base64url(payload_json).base64url(hmac_sha256(secret, payload))``
+with payload ``{"sid": service_id, "sub": wallet, "exp": unix_seconds}``.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class AccessTokenSigner:
+    """Mints and verifies access tokens with a shared HMAC secret."""
+
+    def __init__(self, secret: bytes, ttl_seconds: int = 300):
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
+
+    def mint(self, service_id: str, wallet_address: str, now: Optional[float] = None) -> tuple[str, int]:
+        """
+        Create a token for a wallet and service.
+
+        Returns:
+            The encoded token and its expiry as a unix timestamp
+        """
+        expires_at = int(now if now is not None else time.time()) + self.ttl_seconds
+        payload = json.dumps(
+            {"sid": service_id, "sub": wallet_address.lower(), "exp": expires_at},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}", expires_at
+
+    def verify(self, token: str, service_id: str, now: Optional[float] = None) -> Optional[str]:
+        """Return the wallet the token was issued to, or None if it is invalid."""
+        try:
+            encoded_payload, encoded_signature = token.split(".", 1)
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            claims = json.loads(payload)
+        except ValueError:
+            return None
+        if claims.get("sid") != service_id:
+            return None
+        if claims.get("exp", 0) <= (now if now is not None else time.time()):
+            return None
+        return claims.get("sub")
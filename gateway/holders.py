@@ -0,0 +1,218 @@
+"""
+Local holder index built from ServiceToken Transfer logs.
+
+A background task follows ``Transfer`` events for every ServiceToken (tokens
+created through ServiceTokenFactory are discovered from its ``TokenCreated``
+events) with ``eth_getLogs`` and keeps a wallet -> balance table per token.
+Only blocks at least ``confirmations`` deep are indexed, and the hash of the
+last indexed block is re-checked on every sync so a deeper reorg triggers a
+full rebuild instead of serving stale balances.
+"""
+import asyncio
+import logging
+from typing import Any, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+# keccak256("TokenCreated(string,address,address)")
+TOKEN_CREATED_TOPIC = "0xd2bf5d42456cc3bcd2edc317b3a152d4694756de2b0de76f7fece314b521b9cb"
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+def _topic_to_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+def _log_position(log: dict[str, Any]) -> tuple[int, int]:
+    return int(log["blockNumber"], 16), int(log["logIndex"], 16)
+
+
+class HolderIndex:
+    """Wallet -> balance table per token, kept in sync from chain logs."""
+
+    def __init__(
+        self,
+        rpc_url: str,
+        factory_address: Optional[str] = None,
+        token_addresses: Optional[list[str]] = None,
+        start_block: int = 0,
+        confirmations: int = 12,
+        batch_blocks: int = 2000,
+        poll_interval: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.rpc_url = rpc_url
+        self.factory_address = factory_address.lower() if factory_address else None
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.batch_blocks = max(batch_blocks, 1)
+        self.poll_interval = poll_interval
+        self._client = client
+        self._tracked_tokens = {token.lower() for token in token_addresses or []}
+        self._task: Optional[asyncio.Task] = None
+        self._request_id = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.balances: dict[str, dict[str, int]] = {}
+        self._pending_tokens = set(self._tracked_tokens)
+        self._backfilling: set[str] = set()
+        self.synced_block = self.start_block - 1
+        self._synced_hash: Optional[str] = None
+        self.ready = False
+
+    @property
+    def tokens(self) -> set[str]:
+        return set(self.balances)
+
+    def track(self, token_address: str) -> None:
+        """Start indexing a token; its history is backfilled on the next sync."""
+        token = token_address.lower()
+        self._tracked_tokens.add(token)
+        if token not in self.balances:
+            self._pending_tokens.add(token)
+
+    def balance_of(self, token_address: str, wallet_address: str) -> Optional[int]:
+        """
+        Return the indexed balance, or None if the token is not indexed yet.
+
+        Callers should fall back to an on-chain ``balanceOf`` when this
+        returns None.
+        """
+        if not self.ready or token_address.lower() in self._backfilling:
+            return None
+        holders = self.balances.get(token_address.lower())
+        if holders is None:
+            return None
+        return holders.get(wallet_address.lower(), 0)
+
+    async def _rpc(self, method: str, params: list[Any]) -> Any:
+        self._request_id += 1
+        payload = {"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params}
+        if self._client is not None:
+            resp = await self._client.post(self.rpc_url, json=payload, timeout=30)
+        else:
+            async with httpx.AsyncClient() as client:
+                resp = await client.post(self.rpc_url, json=payload, timeout=30)
+        resp.raise_for_status()
+        body = resp.json()
+        if body.get("error"):
+            raise RuntimeError(f"{method} failed: {body['error']}")
+        return body.get("result")
+
+    async def _block_hash(self, number: int) -> Optional[str]:
+        block = await self._rpc("eth_getBlockByNumber", [hex(number), False])
+        return block.get("hash") if block else None
+
+    async def _get_logs(
+        self, address: Union[str, list[str]], topic: str, from_block: int, to_block: int
+    ) -> list[dict[str, Any]]:
+        logs = await self._rpc(
+            "eth_getLogs",
+            [
+                {
+                    "address": address,
+                    "topics": [topic],
+                    "fromBlock": hex(from_block),
+                    "toBlock": hex(to_block),
+                }
+            ],
+        )
+        return sorted(
+            (log for log in logs or [] if not log.get("removed")), key=_log_position
+        )
+
+    def _apply_transfer(self, log: dict[str, Any]) -> None:
+        token = log["address"].lower()
+        holders = self.balances.setdefault(token, {})
+        sender = _topic_to_address(log["topics"][1])
+        recipient = _topic_to_address(log["topics"][2])
+        value = int(log["data"], 16) if log.get("data") not in (None, "0x") else 0
+        if sender != ZERO_ADDRESS:
+            remaining = holders.get(sender, 0) - value
+            if remaining > 0:
+                holders[sender] = remaining
+            else:
+                holders.pop(sender, None)
+        if recipient != ZERO_ADDRESS and value:
+            holders[recipient] = holders.get(recipient, 0) + value
+
+    async def _index_transfers(self, tokens: list[str], from_block: int, to_block: int) -> None:
+        for start in range(from_block, to_block + 1, self.batch_blocks):
+            end = min(start + self.batch_blocks - 1, to_block)
+            for log in await self._get_logs(tokens, TRANSFER_TOPIC, start, end):
+                self._apply_transfer(log)
+
+    async def _backfill_pending(self) -> None:
+        if not self._pending_tokens:
+            return
+        tokens = sorted(self._pending_tokens)
+        self._pending_tokens.clear()
+        self._backfilling.update(tokens)
+        for token in tokens:
+            self.balances.setdefault(token, {})
+        try:
+            if self.synced_block >= self.start_block:
+                await self._index_transfers(tokens, self.start_block, self.synced_block)
+        except BaseException:
+            for token in tokens:
+                self.balances.pop(token, None)
+            self._pending_tokens.update(tokens)
+            raise
+        finally:
+            self._backfilling.difference_update(tokens)
+
+    async def sync_once(self) -> None:
+        """Index every confirmed block since the last sync."""
+        if self._synced_hash is not None:
+            current = await self._block_hash(self.synced_block)
+            if current != self._synced_hash:
+                logger.warning(
+                    "Reorg past block %d detected, rebuilding holder index", self.synced_block
+                )
+                self._reset()
+
+        await self._backfill_pending()
+        head = int(await self._rpc("eth_blockNumber", []), 16)
+        safe_block = head - self.confirmations
+        for start in range(self.synced_block + 1, safe_block + 1, self.batch_blocks):
+            end = min(start + self.batch_blocks - 1, safe_block)
+            if self.factory_address:
+                created = await self._get_logs(self.factory_address, TOKEN_CREATED_TOPIC, start, end)
+                for log in created:
+                    self.balances.setdefault("0x" + log["data"][26:66].lower(), {})
+            if self.balances:
+                await self._index_transfers(sorted(self.balances), start, end)
+            self.synced_block = end
+            await self._backfill_pending()
+
+        if self.synced_block >= self.start_block:
+            self._synced_hash = await self._block_hash(self.synced_block)
+        self.ready = True
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Holder index sync failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
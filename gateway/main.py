@@ -1,14 +1,102 @@
+import hashlib
+import json
+import logging
 import os
+import secrets
+import time
+from typing import Any, Optional
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from access import AccessTokenSigner
+from holders import HolderIndex
+from profiling import ProfilingMiddleware, SamplingProfiler, profile_section
+from tracing import PARENT_SPAN_HEADER, REQUEST_ID_HEADER, TracingMiddleware, exporter, span, trace_headers
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
 
 BACKEND_BASE = os.getenv("BACKEND_BASE", "http://localhost:8000")
 RPC_URL = os.getenv("RPC_URL")
 TOKEN_ADDRESS = os.getenv("TOKEN_ADDRESS")
 WALLET_HEADER = os.getenv("WALLET_HEADER", "X-Wallet-Address")
+TOKEN_FACTORY_ADDRESS = os.getenv("TOKEN_FACTORY_ADDRESS")
+HOLDER_INDEX_ENABLED = os.getenv("HOLDER_INDEX_ENABLED", "1") == "1"
+API_KEY_HEADER = os.getenv("API_KEY_HEADER", "X-API-Key")
+ACCESS_TOKEN_HEADER = os.getenv("ACCESS_TOKEN_HEADER", "X-Access-Token")
+ACCESS_TOKEN_SECRET = os.getenv("ACCESS_TOKEN_SECRET")
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "300"))
+SERVICE_CACHE_SECONDS = float(os.getenv("SERVICE_CACHE_SECONDS", "30"))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == "1"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+SLOW_REQUEST_MS = os.getenv("SLOW_REQUEST_MS")
+
+
+def json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+app = FastAPI(title="Microservices Gateway", default_response_class=FastJSONResponse)
+
+profiler = SamplingProfiler(
+    interval=float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000,
+    slow_threshold=float(SLOW_REQUEST_MS) / 1000 if PROFILING_ENABLED and SLOW_REQUEST_MS else None,
+)
+if profiler.slow_threshold is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+if PROFILING_ENABLED and not ADMIN_TOKEN:
+    logger.warning("PROFILING_ENABLED is set but ADMIN_TOKEN is not; profiler endpoints stay disabled")
+app.add_middleware(TracingMiddleware, component="gateway")
+
+if not ACCESS_TOKEN_SECRET:
+    logger.warning(
+        "ACCESS_TOKEN_SECRET not set; access tokens are only valid on this instance until restart"
+    )
+signer = AccessTokenSigner(
+    ACCESS_TOKEN_SECRET.encode("utf-8") if ACCESS_TOKEN_SECRET else secrets.token_bytes(32),
+    ttl_seconds=ACCESS_TOKEN_TTL,
+)
+
+holder_index: HolderIndex | None = None
+if HOLDER_INDEX_ENABLED and RPC_URL:
+    holder_index = HolderIndex(
+        RPC_URL,
+        factory_address=TOKEN_FACTORY_ADDRESS,
+        token_addresses=[TOKEN_ADDRESS] if TOKEN_ADDRESS else [],
+        start_block=int(os.getenv("INDEXER_START_BLOCK", "0")),
+        confirmations=int(os.getenv("INDEXER_CONFIRMATIONS", "12")),
+        batch_blocks=int(os.getenv("INDEXER_BATCH_BLOCKS", "2000")),
+        poll_interval=float(os.getenv("INDEXER_POLL_SECONDS", "5")),
+    )
+
+
+@app.on_event("startup")
+async def start_holder_index() -> None:
+    if holder_index is not None:
+        holder_index.start()
+
 
-app = FastAPI(title="Microservices Gateway")
+@app.on_event("shutdown")
+async def stop_holder_index() -> None:
+    if holder_index is not None:
+        await holder_index.stop()
 
 
 @app.get("/health")
@@ -16,8 +104,69 @@ def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
-async def get_token_balance(wallet_address: str) -> int:
-    if not RPC_URL or not TOKEN_ADDRESS:
+def require_admin(admin_token: Optional[str]) -> None:
+    # Fail closed: admin endpoints are unavailable until ADMIN_TOKEN is set.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled: ADMIN_TOKEN not set")
+    if not (admin_token and secrets.compare_digest(admin_token, ADMIN_TOKEN)):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def require_profiling(admin_token: Optional[str]) -> None:
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling disabled")
+    require_admin(admin_token)
+
+
+@app.get("/admin/traces")
+def get_traces(
+    request_id: Optional[str] = None,
+    limit: int = Query(default=200, ge=1, le=2000),
+    x_admin_token: Optional[str] = Header(default=None),
+) -> dict[str, object]:
+    """Recent spans recorded by this instance, optionally for one request ID."""
+    require_admin(x_admin_token)
+    return {"spans": exporter.find(request_id, limit)}
+
+
+@app.post("/admin/profiler/start")
+def start_profiler(
+    interval_ms: Optional[float] = Query(default=None, ge=1, le=1000),
+    reset: bool = True,
+    x_admin_token: Optional[str] = Header(default=None),
+) -> dict[str, object]:
+    require_profiling(x_admin_token)
+    if reset:
+        profiler.reset()
+    profiler.start(interval_ms / 1000 if interval_ms else None)
+    return {"running": True, "interval_ms": profiler.interval * 1000}
+
+
+@app.post("/admin/profiler/stop")
+def stop_profiler(x_admin_token: Optional[str] = Header(default=None)) -> dict[str, object]:
+    require_profiling(x_admin_token)
+    profiler.stop()
+    return {"running": False, "samples": profiler.samples}
+
+
+@app.get("/admin/profiler/folded", response_class=PlainTextResponse)
+def get_profile_folded(x_admin_token: Optional[str] = Header(default=None)) -> str:
+    require_profiling(x_admin_token)
+    return profiler.folded()
+
+
+@app.get("/admin/profiler/slow")
+def get_slow_requests(x_admin_token: Optional[str] = Header(default=None)) -> dict[str, object]:
+    require_profiling(x_admin_token)
+    return {
+        "threshold_ms": SLOW_REQUEST_MS and float(SLOW_REQUEST_MS),
+        "requests": list(profiler.slow_requests),
+    }
+
+
+async def get_token_balance(wallet_address: str, token_address: Optional[str] = None) -> int:
+    token_address = token_address or TOKEN_ADDRESS
+    if not RPC_URL or not token_address:
         return 0
     data = {
         "jsonrpc": "2.0",
@@ -25,7 +174,7 @@ async def get_token_balance(wallet_address: str) -> int:
         "method": "eth_call",
         "params": [
             {
-                "to": TOKEN_ADDRESS,
+                "to": token_address,
                 "data": f"0x70a08231{wallet_address[2:].rjust(64, '0')}",
             },
             "latest",
@@ -34,42 +183,182 @@ async def get_token_balance(wallet_address: str) -> int:
     async with httpx.AsyncClient() as client:
         resp = await client.post(RPC_URL, json=data, timeout=10)
         resp.raise_for_status()
-        result = resp.json().get("result", "0x0")
+        result = json_loads(resp.content).get("result")
+        # "0x" (or nothing) means there is no contract at the address.
+        if not result or result == "0x":
+            return 0
         return int(result, 16)
 
 
-async def has_token_access(request: Request) -> bool:
-    if request.headers.get("X-Dev-Bypass") == "1":
-        return True
+async def get_wallet_balance(token_address: Optional[str], wallet_address: str) -> int:
+    if not token_address:
+        return 0
+    if holder_index is not None:
+        holder_index.track(token_address)
+        balance = holder_index.balance_of(token_address, wallet_address)
+        if balance is not None:
+            return balance
+    # Index still catching up (or disabled): ask the node directly.
+    return await get_token_balance(wallet_address, token_address)
+
+
+_service_cache: dict[str, tuple[float, dict[str, Any]]] = {}
+
+
+def raise_for_backend(resp: httpx.Response) -> None:
+    """Surface backend failures as such instead of as auth or lookup errors."""
+    if resp.status_code == 503:
+        # Admission control shed the call; pass its Retry-After on.
+        retry_after = resp.headers.get("retry-after")
+        raise HTTPException(
+            status_code=503,
+            detail="Backend busy, retry later",
+            headers={"Retry-After": retry_after} if retry_after else None,
+        )
+    if resp.status_code >= 500:
+        raise HTTPException(status_code=502, detail="Backend error")
+
+
+async def get_service(client: httpx.AsyncClient, service_id: str) -> dict[str, Any]:
+    cached = _service_cache.get(service_id)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    service_resp = await client.get(f"{BACKEND_BASE}/services/{service_id}", headers=trace_headers())
+    raise_for_backend(service_resp)
+    if service_resp.status_code != 200:
+        raise HTTPException(status_code=404, detail="Service not found")
+    service = json_loads(service_resp.content)
+    # Only deployed services are cached so a fresh deploy is picked up at once.
+    if SERVICE_CACHE_SECONDS > 0 and service.get("api_base_url"):
+        _service_cache[service_id] = (now + SERVICE_CACHE_SECONDS, service)
+    return service
+
+
+_verified_api_keys: dict[tuple[str, str], float] = {}
+
+
+async def verify_api_key(client: httpx.AsyncClient, service_id: str, api_key: Optional[str]) -> None:
+    """
+    Check an API key with the backend, raising 401 if it is missing or invalid.
+
+    Valid keys are remembered (by hash) for SERVICE_CACHE_SECONDS.
+    """
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API key required")
+    cache_key = (service_id, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+    now = time.monotonic()
+    expires_at = _verified_api_keys.get(cache_key)
+    if expires_at is not None and expires_at > now:
+        return
+    verify_resp = await client.post(
+        f"{BACKEND_BASE}/services/{service_id}/api-key/verify",
+        json={"api_key": api_key},
+        headers=trace_headers(),
+    )
+    if verify_resp.status_code == 404:
+        raise HTTPException(status_code=404, detail="Service not found")
+    raise_for_backend(verify_resp)
+    if verify_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="Backend error")
+    if not json_loads(verify_resp.content).get("valid"):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    if SERVICE_CACHE_SECONDS > 0:
+        _verified_api_keys[cache_key] = now + SERVICE_CACHE_SECONDS
+
+
+def service_token_address(service: dict[str, Any]) -> Optional[str]:
+    return service.get("token_address") or TOKEN_ADDRESS
+
+
+def get_wallet(request: Request) -> Optional[str]:
     wallet = request.headers.get(WALLET_HEADER)
     if not wallet or not wallet.startswith("0x") or len(wallet) != 42:
+        return None
+    return wallet
+
+
+async def has_token_access(
+    request: Request, service_id: str, client: httpx.AsyncClient
+) -> bool:
+    if request.headers.get("X-Dev-Bypass") == "1":
+        return True
+    access_token = request.headers.get(ACCESS_TOKEN_HEADER)
+    if access_token:
+        return signer.verify(access_token, service_id) is not None
+    wallet = get_wallet(request)
+    if wallet is None:
         return False
-    balance = await get_token_balance(wallet)
-    return balance > 0
+    # A wallet alone is not a credential; it must come with the service's API key.
+    await verify_api_key(client, service_id, request.headers.get(API_KEY_HEADER))
+    service = await get_service(client, service_id)
+    return await get_wallet_balance(service_token_address(service), wallet) > 0
 
 
-@app.api_route("/proxy/{service_id}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
-async def proxy_request(service_id: str, path: str, request: Request) -> Response:
-    if not await has_token_access(request):
+@app.post("/access/{service_id}/token")
+async def mint_access_token(service_id: str, request: Request) -> dict[str, object]:
+    """Exchange an API key and a token-holding wallet for a signed access token."""
+    wallet = get_wallet(request)
+    if wallet is None:
         raise HTTPException(status_code=403, detail="Token access required")
 
     async with httpx.AsyncClient() as client:
-        service_resp = await client.get(f"{BACKEND_BASE}/services/{service_id}")
-        if service_resp.status_code != 200:
-            raise HTTPException(status_code=404, detail="Service not found")
-        service = service_resp.json()
+        await verify_api_key(client, service_id, request.headers.get(API_KEY_HEADER))
+        service = await get_service(client, service_id)
+
+    if await get_wallet_balance(service_token_address(service), wallet) <= 0:
+        raise HTTPException(status_code=403, detail="Token access required")
+
+    access_token, expires_at = signer.mint(service_id, wallet)
+    return {
+        "access_token": access_token,
+        "expires_at": expires_at,
+        "service_id": service_id,
+    }
+
+
+@app.api_route("/proxy/{service_id}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+async def proxy_request(service_id: str, path: str, request: Request) -> Response:
+    async with httpx.AsyncClient() as client:
+        with profile_section("gateway.access_check"), span("gateway.access_check", "gateway"):
+            allowed = await has_token_access(request, service_id, client)
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Token access required")
+
+        with profile_section("gateway.service_lookup"), span("gateway.service_lookup", "gateway"):
+            service = await get_service(client, service_id)
         api_base_url = service.get("api_base_url")
         if not api_base_url:
             raise HTTPException(status_code=400, detail="Service not deployed")
 
+        # Gateway credentials are not forwarded to the generated service, and
+        # the incoming trace headers are replaced with this hop's.
+        stripped = {
+            API_KEY_HEADER.lower(),
+            ACCESS_TOKEN_HEADER.lower(),
+            REQUEST_ID_HEADER.lower(),
+            PARENT_SPAN_HEADER.lower(),
+        }
         target_url = f"{api_base_url.rstrip('/')}/{path}"
-        proxied = await client.request(
-            request.method,
-            target_url,
-            content=await request.body(),
-            headers={key: value for key, value in request.headers.items()},
-            params=request.query_params,
-        )
+        with profile_section("gateway.upstream"), span("gateway.upstream", "gateway") as attrs:
+            proxied = await client.request(
+                request.method,
+                target_url,
+                content=await request.body(),
+                headers={
+                    **{
+                        key: value
+                        for key, value in request.headers.items()
+                        if key.lower() not in stripped
+                    },
+                    **trace_headers(),
+                },
+                params=request.query_params,
+            )
+            attrs["status"] = proxied.status_code
+            # Time spent inside the generated service, as reported by its own middleware.
+            if "server-timing" in proxied.headers:
+                attrs["server_timing"] = proxied.headers["server-timing"]
 
     return Response(
         content=proxied.content,
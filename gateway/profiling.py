@@ -0,0 +1,261 @@
+"""
+Opt-in sampling profiler and slow-request capture.
+
+``SamplingProfiler`` samples the stacks of all threads from a background
+thread and aggregates them in the folded format used by flamegraph.pl and
+speedscope (``frame;frame;frame count``). ``ProfilingMiddleware`` records a
+timing breakdown of ``profile_section`` blocks for every request and keeps the
+slowest ones, including stack samples of their worker threads taken while
+they were running past the threshold. Sections that run outside any request,
+such as the store's background flush, are kept in ``background_sections``
+once ``record_background_sections`` is called. When profiling is off,
+sections cost a single context-variable lookup.
+"""
+from __future__ import annotations
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Callable, Iterator, TypeVar
+
+MAX_STACKS = 10000
+# Sampling faster than this spends more time walking stacks than serving requests.
+MIN_INTERVAL = 0.001
+TRUNCATED_STACK = "[truncated]"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def fold_stack(frame: FrameType | None) -> str:
+    """Render a frame chain root-first as one folded-stack line."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def _add_sample(stacks: Counter[str], stack: str) -> None:
+    if stack in stacks or len(stacks) < MAX_STACKS:
+        stacks[stack] += 1
+    else:
+        stacks[TRUNCATED_STACK] += 1
+
+
+def render_folded(stacks: Counter[str]) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+@dataclass
+class RequestProfile:
+    """Timing breakdown of one request."""
+
+    method: str
+    path: str
+    started: float = field(default_factory=time.perf_counter)
+    sections: list[tuple[str, float]] = field(default_factory=list)
+    threads: set[int] = field(default_factory=set)
+    stacks: Counter[str] = field(default_factory=Counter)
+
+
+_current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+# Recent sections timed outside any request, newest last.
+background_sections: deque[dict[str, Any]] = deque(maxlen=100)
+_record_background = False
+
+
+def record_background_sections(enabled: bool = True) -> None:
+    """Start (or stop) keeping timings of sections that run outside requests."""
+    global _record_background
+    _record_background = enabled
+
+
+@contextmanager
+def _background_section(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        background_sections.append(
+            {
+                "name": name,
+                "thread": threading.current_thread().name,
+                "finished_at": round(time.time(), 3),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+        )
+
+
+@contextmanager
+def profile_section(name: str) -> Iterator[None]:
+    """Time a block as part of the current request's breakdown."""
+    profile = _current_profile.get()
+    if profile is None:
+        if _record_background:
+            with _background_section(name):
+                yield
+        else:
+            yield
+        return
+    profile.threads.add(threading.get_ident())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections.append((name, time.perf_counter() - started))
+
+
+def profiled(name: str) -> Callable[[F], F]:
+    """Decorator form of ``profile_section``."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with profile_section(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+class SamplingProfiler:
+    """
+    Background-thread stack sampler.
+
+    The thread only runs while global profiling is on or slow-request
+    capture has requests in flight.
+    """
+
+    def __init__(self, interval: float = 0.005, slow_threshold: float | None = None) -> None:
+        self.interval = max(interval, MIN_INTERVAL)
+        self.slow_threshold = slow_threshold
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.running = False
+        self.slow_requests: deque[dict[str, Any]] = deque(maxlen=50)
+        self._in_flight: dict[int, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, interval: float | None = None) -> None:
+        with self._lock:
+            if interval:
+                self.interval = max(interval, MIN_INTERVAL)
+            self.running = True
+            self._ensure_thread()
+
+    def stop(self) -> None:
+        with self._lock:
+            self.running = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+
+    def folded(self) -> str:
+        with self._lock:
+            return render_folded(self.stacks)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self.running and not self._in_flight:
+                    self._thread = None
+                    return
+                interval = self.interval
+                now = time.perf_counter()
+                overdue = self.slow_threshold is not None and any(
+                    now - profile.started >= self.slow_threshold
+                    for profile in self._in_flight.values()
+                )
+            if not self.running and not overdue:
+                time.sleep(interval)
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                if self.running:
+                    self.samples += 1
+                    for thread_id, frame in frames.items():
+                        if thread_id != own_id:
+                            _add_sample(self.stacks, fold_stack(frame))
+                for profile in self._in_flight.values():
+                    if self.slow_threshold is None or now - profile.started < self.slow_threshold:
+                        continue
+                    for thread_id in profile.threads:
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            _add_sample(profile.stacks, fold_stack(frame))
+            del frames
+            time.sleep(interval)
+
+    def begin_request(self, method: str, path: str) -> RequestProfile:
+        profile = RequestProfile(method=method, path=path)
+        with self._lock:
+            self._in_flight[id(profile)] = profile
+            self._ensure_thread()
+        return profile
+
+    def end_request(self, profile: RequestProfile, status: int | None) -> None:
+        duration = time.perf_counter() - profile.started
+        with self._lock:
+            self._in_flight.pop(id(profile), None)
+            if self.slow_threshold is None or duration < self.slow_threshold:
+                return
+            self.slow_requests.append(
+                {
+                    "method": profile.method,
+                    "path": profile.path,
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 2),
+                    "sections": [
+                        {"name": name, "duration_ms": round(seconds * 1000, 2)}
+                        for name, seconds in profile.sections
+                    ],
+                    "folded": render_folded(profile.stacks),
+                }
+            )
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that records per-request breakdowns for slow-request capture."""
+
+    def __init__(self, app: Any, profiler: SamplingProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or self.profiler.slow_threshold is None:
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.begin_request(scope["method"], scope["path"])
+        status: int | None = None
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            self.profiler.end_request(profile, status)
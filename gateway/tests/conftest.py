@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The gateway is a flat app directory; make its modules importable as in production.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
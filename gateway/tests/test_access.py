@@ -0,0 +1,127 @@
+"""Gateway access checks against a mocked backend, RPC node and service."""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+SERVICE_ID = "svc"
+WALLET = "0x" + "1" * 40
+TOKEN = "0x" + "a" * 40
+
+
+class MockUpstreams:
+    """Backend, JSON-RPC node and generated service behind one MockTransport."""
+
+    def __init__(self) -> None:
+        self.balance_result = "0x" + "1".rjust(64, "0")
+        self.api_key_valid = True
+        self.backend_status = 200
+        self.backend_headers: dict[str, str] = {}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "backend":
+            if self.backend_status != 200:
+                return httpx.Response(
+                    self.backend_status, json={"detail": "error"}, headers=self.backend_headers
+                )
+            if request.url.path.endswith("/api-key/verify"):
+                return httpx.Response(200, json={"valid": self.api_key_valid})
+            return httpx.Response(
+                200,
+                json={"id": SERVICE_ID, "token_address": TOKEN, "api_base_url": "http://service"},
+            )
+        if request.url.host == "rpc":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": self.balance_result})
+        return httpx.Response(200, json={"path": request.url.path})
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    mock = MockUpstreams()
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(main, "BACKEND_BASE", "http://backend")
+    monkeypatch.setattr(main, "RPC_URL", "http://rpc")
+    monkeypatch.setattr(main, "holder_index", None)
+    monkeypatch.setattr(
+        main.httpx,
+        "AsyncClient",
+        lambda *args, **kwargs: real_client(transport=httpx.MockTransport(mock.handle)),
+    )
+    main._service_cache.clear()
+    main._verified_api_keys.clear()
+    return mock
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(main.app)
+
+
+WALLET_HEADERS = {"X-Wallet-Address": WALLET, "X-API-Key": "key"}
+
+
+def test_wallet_with_balance_is_proxied(upstreams, client) -> None:
+    response = client.get(f"/proxy/{SERVICE_ID}/process", headers=WALLET_HEADERS)
+
+    assert response.status_code == 200
+    assert response.json() == {"path": "/process"}
+
+
+def test_wallet_without_api_key_is_rejected(upstreams, client) -> None:
+    response = client.get(f"/proxy/{SERVICE_ID}/process", headers={"X-Wallet-Address": WALLET})
+
+    assert response.status_code == 401
+
+
+def test_wallet_with_invalid_api_key_is_rejected(upstreams, client) -> None:
+    upstreams.api_key_valid = False
+
+    response = client.get(f"/proxy/{SERVICE_ID}/process", headers=WALLET_HEADERS)
+
+    assert response.status_code == 401
+
+
+def test_access_token_needs_no_api_key(upstreams, client) -> None:
+    access_token = mint(client).json()["access_token"]
+
+    response = client.get(f"/proxy/{SERVICE_ID}/process", headers={"X-Access-Token": access_token})
+
+    assert response.status_code == 200
+
+
+def test_token_without_contract_counts_as_zero_balance(upstreams, client) -> None:
+    upstreams.balance_result = "0x"
+
+    response = client.get(f"/proxy/{SERVICE_ID}/process", headers=WALLET_HEADERS)
+
+    assert response.status_code == 403
+
+
+def mint(client: TestClient) -> httpx.Response:
+    return client.post(
+        f"/access/{SERVICE_ID}/token",
+        headers={"X-Wallet-Address": WALLET, "X-API-Key": "key"},
+    )
+
+
+def test_mint_rejects_an_invalid_api_key(upstreams, client) -> None:
+    upstreams.api_key_valid = False
+
+    assert mint(client).status_code == 401
+
+
+def test_backend_overload_is_not_reported_as_an_invalid_key(upstreams, client) -> None:
+    upstreams.backend_status = 503
+    upstreams.backend_headers = {"Retry-After": "2"}
+
+    response = mint(client)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+
+
+def test_backend_errors_become_bad_gateway(upstreams, client) -> None:
+    upstreams.backend_status = 500
+
+    assert mint(client).status_code == 502
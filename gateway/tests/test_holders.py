@@ -0,0 +1,187 @@
+"""HolderIndex against a local mock JSON-RPC node."""
+import asyncio
+import json
+from typing import Any
+
+import httpx
+
+from holders import TOKEN_CREATED_TOPIC, TRANSFER_TOPIC, ZERO_ADDRESS, HolderIndex
+
+FACTORY = "0x" + "f" * 40
+TOKEN_A = "0x" + "a" * 40
+TOKEN_B = "0x" + "b" * 40
+ALICE = "0x" + "1" * 40
+BOB = "0x" + "2" * 40
+
+
+def _word(value: str) -> str:
+    return value[2:].rjust(64, "0")
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + _word(address)
+
+
+class MockNode:
+    """Minimal JSON-RPC node: a chain of block hashes plus logs per block."""
+
+    def __init__(self, head: int = 0) -> None:
+        self.head = head
+        self.hashes: dict[int, str] = {}
+        self.logs: list[dict[str, Any]] = []
+        self.fork = 0
+
+    def block_hash(self, number: int) -> str:
+        return self.hashes.setdefault(number, f"0x{self.fork:02x}{number:062x}")
+
+    def add_log(self, block: int, address: str, topics: list[str], data: str) -> None:
+        self.logs.append(
+            {
+                "address": address,
+                "topics": topics,
+                "data": data,
+                "blockNumber": hex(block),
+                "logIndex": hex(len(self.logs)),
+                "blockHash": self.block_hash(block),
+                "removed": False,
+            }
+        )
+
+    def token_created(self, block: int, token: str) -> None:
+        self.add_log(block, FACTORY, [TOKEN_CREATED_TOPIC, "0x" + "0" * 64], "0x" + _word(token) + _word(ALICE))
+
+    def transfer(self, block: int, token: str, sender: str, recipient: str, value: int) -> None:
+        self.add_log(
+            block,
+            token,
+            [TRANSFER_TOPIC, _address_topic(sender), _address_topic(recipient)],
+            hex(value),
+        )
+
+    def reorg(self, from_block: int) -> None:
+        """Replace every block from ``from_block`` on with a new fork that has no logs."""
+        self.fork += 1
+        self.hashes = {number: value for number, value in self.hashes.items() if number < from_block}
+        self.logs = [log for log in self.logs if int(log["blockNumber"], 16) < from_block]
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        method, params = payload["method"], payload["params"]
+        if method == "eth_blockNumber":
+            result: Any = hex(self.head)
+        elif method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            result = {"hash": self.block_hash(number)} if number <= self.head else None
+        elif method == "eth_getLogs":
+            result = self._get_logs(params[0])
+        else:
+            return httpx.Response(200, json={"id": payload["id"], "error": {"message": method}})
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": payload["id"], "result": result})
+
+    def _get_logs(self, query: dict[str, Any]) -> list[dict[str, Any]]:
+        addresses = query["address"] if isinstance(query["address"], list) else [query["address"]]
+        addresses = {address.lower() for address in addresses}
+        from_block, to_block = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        return [
+            log
+            for log in self.logs
+            if log["address"].lower() in addresses
+            and log["topics"][0] == query["topics"][0]
+            and from_block <= int(log["blockNumber"], 16) <= to_block
+        ]
+
+
+def make_index(node: MockNode, **kwargs: Any) -> HolderIndex:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(node.handle))
+    options: dict[str, Any] = {"confirmations": 0, "batch_blocks": 3}
+    options.update(kwargs)
+    return HolderIndex("http://node", client=client, **options)
+
+
+def sync(index: HolderIndex) -> None:
+    asyncio.run(index.sync_once())
+
+
+def test_discovers_factory_tokens_and_applies_transfers() -> None:
+    node = MockNode(head=10)
+    node.token_created(1, TOKEN_A)
+    node.transfer(2, TOKEN_A, ZERO_ADDRESS, ALICE, 100)
+    node.transfer(5, TOKEN_A, ALICE, BOB, 30)
+    node.transfer(7, TOKEN_A, BOB, ZERO_ADDRESS, 30)
+    index = make_index(node, factory_address=FACTORY)
+
+    assert index.balance_of(TOKEN_A, ALICE) is None
+    sync(index)
+
+    assert index.tokens == {TOKEN_A}
+    assert index.balance_of(TOKEN_A, ALICE) == 70
+    assert index.balance_of(TOKEN_A, BOB) == 0
+    assert BOB not in index.balances[TOKEN_A]
+    assert index.balance_of(TOKEN_B, ALICE) is None
+
+
+def test_only_confirmed_blocks_are_indexed() -> None:
+    node = MockNode(head=10)
+    node.transfer(4, TOKEN_A, ZERO_ADDRESS, ALICE, 5)
+    node.transfer(8, TOKEN_A, ZERO_ADDRESS, ALICE, 7)
+    index = make_index(node, token_addresses=[TOKEN_A], confirmations=4)
+
+    sync(index)
+    assert index.synced_block == 6
+    assert index.balance_of(TOKEN_A, ALICE) == 5
+
+    node.head = 12
+    sync(index)
+    assert index.synced_block == 8
+    assert index.balance_of(TOKEN_A, ALICE) == 12
+
+
+def test_reorg_rebuilds_from_the_new_chain() -> None:
+    node = MockNode(head=10)
+    node.token_created(1, TOKEN_A)
+    node.transfer(2, TOKEN_A, ZERO_ADDRESS, ALICE, 100)
+    node.transfer(9, TOKEN_A, ALICE, BOB, 40)
+    index = make_index(node, factory_address=FACTORY)
+    sync(index)
+    assert index.balance_of(TOKEN_A, BOB) == 40
+
+    node.reorg(from_block=8)
+    node.transfer(9, TOKEN_A, ALICE, BOB, 10)
+    sync(index)
+
+    assert index.balance_of(TOKEN_A, ALICE) == 90
+    assert index.balance_of(TOKEN_A, BOB) == 10
+    assert index.synced_block == 10
+
+
+def test_late_track_backfills_history() -> None:
+    node = MockNode(head=10)
+    node.transfer(2, TOKEN_B, ZERO_ADDRESS, ALICE, 3)
+    node.transfer(6, TOKEN_B, ALICE, BOB, 1)
+    index = make_index(node, token_addresses=[TOKEN_A])
+    sync(index)
+    assert index.balance_of(TOKEN_B, ALICE) is None
+
+    index.track(TOKEN_B)
+    node.head = 12
+    node.transfer(11, TOKEN_B, ZERO_ADDRESS, BOB, 5)
+    sync(index)
+
+    assert index.balance_of(TOKEN_B, ALICE) == 2
+    assert index.balance_of(TOKEN_B, BOB) == 6
+
+
+def test_tracked_tokens_survive_a_reorg() -> None:
+    node = MockNode(head=10)
+    node.transfer(3, TOKEN_B, ZERO_ADDRESS, ALICE, 4)
+    index = make_index(node)
+    sync(index)
+    index.track(TOKEN_B)
+    sync(index)
+    assert index.balance_of(TOKEN_B, ALICE) == 4
+
+    node.reorg(from_block=5)
+    sync(index)
+
+    assert index.tokens == {TOKEN_B}
+    assert index.balance_of(TOKEN_B, ALICE) == 4
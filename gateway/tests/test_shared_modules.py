@@ -0,0 +1,16 @@
+"""The gateway ships its own copies of backend modules; keep them in sync."""
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.mark.parametrize("name", ["profiling.py", "tracing.py"])
+def test_copied_module_matches_backend(name: str) -> None:
+    gateway_copy = (ROOT / "gateway" / name).read_bytes()
+    backend_copy = (ROOT / "backend" / "src" / name).read_bytes()
+
+    assert gateway_copy == backend_copy, (
+        f"gateway/{name} and backend/src/{name} differ; apply the change to both"
+    )
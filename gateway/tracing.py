@@ -0,0 +1,179 @@
+"""
+Request correlation and span timing.
+
+Every request carries an ``X-Request-ID`` (taken from the caller or generated)
+and the caller's span id in ``X-Parent-Span-ID``. Components record spans
+(name, request id, parent, start, duration) into a buffered exporter: an
+in-process ring that can be queried, plus an optional JSON-lines file written
+in batches. Joining spans on the request id shows which hop of
+gateway -> backend -> generated service caused a slow request.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+
+
+@dataclass(frozen=True)
+class TraceContext:
+    request_id: str
+    span_id: str
+
+
+_current_trace: ContextVar[TraceContext | None] = ContextVar("current_trace", default=None)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class SpanExporter:
+    """In-process ring of recent spans with an optional batched JSON-lines file."""
+
+    def __init__(self, ring_size: int = 2048, path: Path | None = None, batch_size: int = 100) -> None:
+        self.ring: deque[dict[str, Any]] = deque(maxlen=ring_size)
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        if path is not None:
+            atexit.register(self.flush)
+
+    def export(self, span: dict[str, Any]) -> None:
+        with self._lock:
+            self.ring.append(span)
+            if self.path is None:
+                return
+            self._pending.append(span)
+            if len(self._pending) < self.batch_size:
+                return
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def _write(self, spans: list[dict[str, Any]]) -> None:
+        if not spans or self.path is None:
+            return
+        lines = "".join(json.dumps(span, separators=(",", ":")) + "\n" for span in spans)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as handle:
+            handle.write(lines)
+
+    def find(self, request_id: str | None = None, limit: int = 200) -> list[dict[str, Any]]:
+        with self._lock:
+            spans = list(self.ring)
+        if request_id is not None:
+            spans = [span for span in spans if span["request_id"] == request_id]
+        return spans[-limit:]
+
+
+exporter = SpanExporter(
+    ring_size=int(os.getenv("TRACE_RING_SIZE", "2048")),
+    path=Path(os.environ["TRACE_FILE"]) if os.getenv("TRACE_FILE") else None,
+    batch_size=int(os.getenv("TRACE_FILE_BATCH", "100")),
+)
+
+
+def current_trace() -> TraceContext | None:
+    return _current_trace.get()
+
+
+def trace_headers() -> dict[str, str]:
+    """Headers that propagate the current trace to a downstream call."""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    return {REQUEST_ID_HEADER: trace.request_id, PARENT_SPAN_HEADER: trace.span_id}
+
+
+@contextmanager
+def span(
+    name: str,
+    component: str,
+    request_id: str | None = None,
+    parent_id: str | None = None,
+    **attrs: Any,
+) -> Iterator[dict[str, Any]]:
+    """
+    Record a span around a block; yields its attribute dict for annotation.
+
+    Without an explicit ``request_id`` the span joins the current trace as a
+    child of the current span.
+    """
+    parent = _current_trace.get()
+    if request_id is None:
+        request_id = parent.request_id if parent else _new_id()
+        parent_id = parent.span_id if parent else None
+    span_id = _new_id()
+    token = _current_trace.set(TraceContext(request_id, span_id))
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        _current_trace.reset(token)
+        exporter.export(
+            {
+                "request_id": request_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "component": component,
+                "name": name,
+                "start": round(started_at, 6),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "attrs": attrs,
+            }
+        )
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a root span per request and echoes ``X-Request-ID``."""
+
+    def __init__(self, app: Any, component: str) -> None:
+        self.app = app
+        self.component = component
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        request_id = headers.get(REQUEST_ID_HEADER.lower()) or uuid.uuid4().hex
+        parent_id = headers.get(PARENT_SPAN_HEADER.lower())
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            self.component,
+            request_id=request_id[:64],
+            parent_id=parent_id,
+        ) as attrs:
+
+            header_name = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+            async def send_wrapper(message: dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    attrs["status"] = message["status"]
+                    message["headers"] = [
+                        *(item for item in message.get("headers", []) if item[0].lower() != header_name),
+                        (header_name, request_id[:64].encode("latin-1")),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)